@@ -0,0 +1,231 @@
+import asyncio
+import ipaddress
+import os
+import re
+import socket
+import time
+
+import yaml
+
+WEB_PORT = 5000  # pros_web_server
+ROSBRIDGE_PORT = 9090
+MAX_PROFILES = 20
+MAX_SCAN_HOSTS = 4096  # 避免誤輸入 /16 之類的大網段
+
+_HOSTNAME_RE = re.compile(
+    r"^(?=.{1,253}$)([A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)"
+    r"(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*\.?$"
+)
+
+
+def validate_host(host: str) -> bool:
+    """接受 IPv4、IPv6（可帶中括號）與 hostname"""
+    if not host:
+        return False
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        pass
+    # 全數字加點的字串不當成 hostname（例如 192.168.0.300）
+    if re.fullmatch(r"[0-9.]+", host):
+        return False
+    return bool(_HOSTNAME_RE.match(host))
+
+
+def format_host(host: str) -> str:
+    """URL 用的 host，IPv6 需加上中括號"""
+    host = host.strip("[]")
+    try:
+        if ipaddress.ip_address(host).version == 6:
+            return f"[{host}]"
+    except ValueError:
+        pass
+    return host
+
+
+def local_subnet() -> str:
+    """推測本機所在的 /24 網段，拿不到時回傳 192.168.0.0/24"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # UDP connect 不會真的送封包，只是讓 OS 選出對外介面
+        s.connect(("10.255.255.255", 1))
+        ip = s.getsockname()[0]
+    except OSError:
+        ip = "192.168.0.1"
+    finally:
+        s.close()
+    return str(ipaddress.ip_network(f"{ip}/24", strict=False))
+
+
+def expand_targets(spec: str) -> list:
+    """
+    spec: 以逗號或空白分隔的網段 / 主機清單，例如
+    "192.168.0.0/24", "robot.local, 10.0.0.5", "fe80::1"
+    空字串時掃描本機所在的 /24。
+    """
+    spec = spec.strip() or local_subnet()
+    hosts = []
+    for item in re.split(r"[,\s]+", spec):
+        if not item:
+            continue
+        if "/" in item:
+            try:
+                net = ipaddress.ip_network(item, strict=False)
+            except ValueError as e:
+                raise ValueError(f"Invalid subnet: {item}") from e
+            if net.num_addresses > MAX_SCAN_HOSTS + 2:
+                raise ValueError(f"Subnet too large: {item}")
+            hosts.extend(str(h) for h in net.hosts())
+        elif validate_host(item):
+            hosts.append(item.strip("[]"))
+        else:
+            raise ValueError(f"Invalid host: {item}")
+    # 保持順序並去除重複
+    return list(dict.fromkeys(hosts))
+
+
+class ScanResult:
+    def __init__(self, host, port, web_ok, rosbridge_ok, latency_ms):
+        self.host = host
+        self.port = port
+        self.web_ok = web_ok
+        self.rosbridge_ok = rosbridge_ok
+        self.latency_ms = latency_ms  # TCP connect 時間，None 表示沒連上
+
+    @property
+    def reachable(self) -> bool:
+        return self.web_ok
+
+    def sort_key(self):
+        # 兩個 port 都有開的優先，再比延遲
+        return (not self.rosbridge_ok, self.latency_ms)
+
+    def __repr__(self):
+        return (
+            f"ScanResult({self.host}:{self.port}, web={self.web_ok}, "
+            f"rosbridge={self.rosbridge_ok}, latency_ms={self.latency_ms})"
+        )
+
+
+async def _probe_port(host: str, port: int, timeout: float):
+    """回傳 TCP connect 花費的毫秒數，失敗時回傳 None"""
+    start = time.perf_counter()
+    try:
+        # 包含 DNS 解析在內都受 timeout 限制
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed = (time.perf_counter() - start) * 1000.0
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return elapsed
+
+
+async def _probe_host(host, web_port, rosbridge_port, timeout, sem):
+    async with sem:
+        web, ros = await asyncio.gather(
+            _probe_port(host, web_port, timeout),
+            _probe_port(host, rosbridge_port, timeout),
+        )
+    return ScanResult(host, web_port, web is not None, ros is not None, web)
+
+
+async def scan(
+    hosts,
+    web_port: int = WEB_PORT,
+    rosbridge_port: int = ROSBRIDGE_PORT,
+    timeout: float = 0.5,
+    concurrency: int = 256,
+):
+    """
+    同時探測所有 host 的 web_port 與 rosbridge_port。
+    每個 host 最多花 timeout 秒，/24 在 concurrency=256 時約一秒內完成。
+    只回傳 web_port 有回應的結果，依 sort_key 排序。
+    """
+    sem = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(
+        *(_probe_host(h, web_port, rosbridge_port, timeout, sem) for h in hosts)
+    )
+    found = [r for r in results if r.reachable]
+    found.sort(key=ScanResult.sort_key)
+    return found
+
+
+def scan_sync(spec: str, web_port: int = WEB_PORT, **kwargs):
+    """給 worker thread 用的同步版本"""
+    return asyncio.run(scan(expand_targets(spec), web_port, **kwargs))
+
+
+class ProfileStore:
+    """最近連線過 / 掃描到的機器人，存成 YAML"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # list[dict]: host, port, latency_ms（掃描的 TCP 連線時間）, connect_ms
+        # （Connect 的 star_car HTTP 來回）, rosbridge, last_seen
+        self.profiles = []
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = yaml.safe_load(f) or {}
+            self.profiles = list(data.get("profiles", []))
+        except (OSError, yaml.YAMLError) as e:
+            print(f"[WARN] Failed to load profiles from {self.path}: {e}")
+            self.profiles = []
+
+    def save(self):
+        try:
+            with open(self.path, "w") as f:
+                yaml.safe_dump({"profiles": self.profiles}, f, sort_keys=False)
+        except OSError as e:
+            print(f"[WARN] Failed to save profiles to {self.path}: {e}")
+
+    def record(
+        self, host: str, port: int, latency_ms=None, rosbridge_ok=None, connect_ms=None
+    ):
+        profile = self.get(host, port) or {"host": host, "port": port}
+        if profile in self.profiles:
+            self.profiles.remove(profile)
+        if latency_ms is not None:
+            profile["latency_ms"] = round(float(latency_ms), 1)
+        if connect_ms is not None:
+            profile["connect_ms"] = round(float(connect_ms), 1)
+        if rosbridge_ok is not None:
+            profile["rosbridge"] = bool(rosbridge_ok)
+        profile["last_seen"] = int(time.time())
+        # 最新的放最前面
+        self.profiles.insert(0, profile)
+        del self.profiles[MAX_PROFILES:]
+
+    def record_scan(self, results):
+        for r in reversed(results):  # 讓延遲最低的排在最前
+            self.record(r.host, r.port, r.latency_ms, r.rosbridge_ok)
+        self.save()
+
+    def best(self):
+        """
+        rosbridge 也有開、上次掃描延遲最低的 profile，沒有則回傳 None。
+        只比 latency_ms；手動連線、從沒掃描過的機器人排在有量測值的後面。
+        """
+        candidates = [p for p in self.profiles if p.get("rosbridge")]
+        return min(
+            candidates,
+            key=lambda p: (p.get("latency_ms") is None, p.get("latency_ms") or 0.0),
+            default=None,
+        )
+
+    def get(self, host: str, port: int):
+        for p in self.profiles:
+            if p.get("host") == host and p.get("port") == port:
+                return p
+        return None
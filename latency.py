@@ -0,0 +1,265 @@
+import collections
+import json
+import sys
+import threading
+import time
+
+import roslibpy
+
+PROBE_TOPIC = "/latency_probe"
+ECHO_TOPIC = "/latency_probe_echo"
+PROBE_TYPE = "std_msgs/String"
+PENDING_TIMEOUT = 5.0  # 超過幾秒沒收到 echo 就算遺失
+OFFSET_WINDOW = 8  # NTP clock filter：取最近幾筆中 delay 最小的 offset
+SAMPLE_WINDOW = 2000  # 每個 topic 只保留最近幾筆算 percentile，長時間開著也不會一直長
+
+
+def percentile(values, p):
+    """values 需已排序"""
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+class LatencySeries:
+    """最近 SAMPLE_WINDOW 筆延遲，另外累計總筆數與歷史最大值"""
+
+    def __init__(self, window: int = SAMPLE_WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.max = None
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def summary(self):
+        stats = summarize(self.samples)
+        stats["window"] = stats["count"]
+        stats["count"] = self.count
+        stats["max"] = self.max
+        return stats
+
+
+def ntp_sample(t0, t1, t2, t3):
+    """
+    t0: 筆電送出, t1: 機器人收到, t2: 機器人回送, t3: 筆電收到
+    回傳 (offset, delay)，offset 為機器人時鐘減筆電時鐘
+    """
+    offset = ((t1 - t0) + (t2 - t3)) / 2.0
+    delay = (t3 - t0) - (t2 - t1)
+    return offset, delay
+
+
+class LatencyProbe:
+    """
+    每送出一個指令就在 PROBE_TOPIC 發一個帶 seq 與送出時間的 probe，
+    機器人端（或 echo node）在 ECHO_TOPIC 回送並附上收到 / 回送時間，
+    用 NTP 的方式估計時鐘差，算出單程與來回延遲。
+    """
+
+    def __init__(self, ros, ping_interval: float = 1.0, min_interval: float = 0.2):
+        """
+        min_interval: 同一個 topic 兩個 probe 之間至少間隔幾秒。
+        teleop 每個 tick 都會 publish，不限制的話 probe 會跟指令一樣多
+        """
+        self.ros = ros
+        self.ping_interval = ping_interval
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._pending = {}  # seq -> (topic, t0)
+        self._offsets = []  # 最近的 (delay, offset)
+        self.offset = None
+        self.lost = 0
+        self.rtt_ms = {}  # topic -> LatencySeries
+        self.uplink_ms = {}  # topic -> LatencySeries，筆電 -> 機器人
+        self.downlink_ms = {}  # topic -> LatencySeries，機器人 -> 筆電
+        self._last_stamp = 0.0
+        self._last_topic_stamp = {}  # topic -> 上次送 probe 的時間
+        self._stop = threading.Event()
+        self._probe_pub = None
+        self._echo_sub = None
+
+    def start(self):
+        self._probe_pub = roslibpy.Topic(self.ros, PROBE_TOPIC, PROBE_TYPE)
+        self._probe_pub.advertise()
+        self._echo_sub = roslibpy.Topic(self.ros, ECHO_TOPIC, PROBE_TYPE)
+        self._echo_sub.subscribe(self._on_echo)
+        self._stop.clear()
+        threading.Thread(target=self._ping_loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            if self._echo_sub is not None:
+                self._echo_sub.unsubscribe()
+            if self._probe_pub is not None:
+                self._probe_pub.unadvertise()
+        except Exception as e:
+            print(f"[WARN] Failed to stop latency probe: {e}")
+        self._echo_sub = None
+        self._probe_pub = None
+
+    def stamp(self, topic: str):
+        """在指令送出後呼叫，topic 為該指令的 topic 名稱"""
+        pub = self._probe_pub
+        if pub is None:
+            return
+        t0 = time.time()
+        with self._lock:
+            if t0 - self._last_topic_stamp.get(topic, 0.0) < self.min_interval:
+                return
+            self._last_topic_stamp[topic] = t0
+            self._seq += 1
+            seq = self._seq
+            self._pending[seq] = (topic, t0)
+            self._last_stamp = t0
+        pub.publish(
+            roslibpy.Message(
+                {"data": json.dumps({"seq": seq, "topic": topic, "t0": t0})}
+            )
+        )
+
+    def _ping_loop(self):
+        # 沒有指令時也定期送 ping，讓 clock offset 持續更新
+        while not self._stop.wait(self.ping_interval):
+            if time.time() - self._last_stamp >= self.ping_interval:
+                self.stamp("ping")
+            self._expire_pending()
+
+    def _expire_pending(self):
+        deadline = time.time() - PENDING_TIMEOUT
+        with self._lock:
+            expired = [s for s, (_, t0) in self._pending.items() if t0 < deadline]
+            for s in expired:
+                del self._pending[s]
+            self.lost += len(expired)
+
+    def _on_echo(self, message):
+        t3 = time.time()
+        try:
+            data = json.loads(message["data"])
+            seq, t1, t2 = data["seq"], float(data["t1"]), float(data["t2"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"[WARN] Bad latency echo: {e}")
+            return
+
+        with self._lock:
+            entry = self._pending.pop(seq, None)
+            if entry is None:
+                return  # 已過期或不是這個 session 送的
+            topic, t0 = entry
+            offset, delay = ntp_sample(t0, t1, t2, t3)
+            self._offsets.append((delay, offset))
+            del self._offsets[:-OFFSET_WINDOW]
+            self.offset = min(self._offsets)[1]
+
+            if topic not in self.rtt_ms:
+                for series in (self.rtt_ms, self.uplink_ms, self.downlink_ms):
+                    series[topic] = LatencySeries()
+            self.rtt_ms[topic].add((t3 - t0) * 1000.0)
+            self.uplink_ms[topic].add((t1 - self.offset - t0) * 1000.0)
+            self.downlink_ms[topic].add((t3 - (t2 - self.offset)) * 1000.0)
+
+    def report(self) -> str:
+        def fmt(stats):
+            if not stats["count"]:
+                return "no samples"
+            window = (
+                f" (last {stats['window']})"
+                if stats["window"] < stats["count"]
+                else ""
+            )
+            return (
+                f"n={stats['count']}{window} p50={stats['p50']:.1f} "
+                f"p90={stats['p90']:.1f} p99={stats['p99']:.1f} "
+                f"max={stats['max']:.1f} ms"
+            )
+
+        with self._lock:
+            topics = sorted(self.rtt_ms)
+            lines = []
+            if self.offset is not None:
+                offset_ms = self.offset * 1000.0
+                lines.append(f"Clock offset (robot - laptop): {offset_ms:.1f} ms")
+            for topic in topics:
+                lines.append(topic)
+                for name, samples in (
+                    ("round trip", self.rtt_ms),
+                    ("laptop -> robot", self.uplink_ms),
+                    ("robot -> laptop", self.downlink_ms),
+                ):
+                    lines.append(f"  {name}: {fmt(samples[topic].summary())}")
+            lines.append(f"Lost probes: {self.lost}, pending: {len(self._pending)}")
+        if not topics:
+            lines.insert(0, f"No echoes received on {ECHO_TOPIC}.")
+        return "\n".join(lines)
+
+
+def echo_probe(message):
+    """
+    echo 端的處理：收到 PROBE_TOPIC 的訊息時補上 t1（收到）/ t2（送出），
+    回傳要 publish 到 ECHO_TOPIC 的 message dict；格式不對時回傳 None。
+    echo node 與模擬機器人共用，探針格式只在這裡定義
+    """
+    t1 = time.time()
+    try:
+        data = json.loads(message["data"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    data["t1"] = t1
+    data["t2"] = time.time()
+    return {"data": json.dumps(data)}
+
+
+def run_echo_node(host: str = "127.0.0.1", port: int = 9090):
+    """
+    本機測試用的 echo node：收到 PROBE_TOPIC 就補上 t1 / t2 回送到 ECHO_TOPIC。
+    用法：python latency.py [host] [port]
+    """
+    ros = roslibpy.Ros(host=host, port=port)
+    ros.run()
+    echo_pub = roslibpy.Topic(ros, ECHO_TOPIC, PROBE_TYPE)
+    echo_pub.advertise()
+
+    def on_probe(message):
+        echo = echo_probe(message)
+        if echo is not None:
+            echo_pub.publish(roslibpy.Message(echo))
+
+    probe_sub = roslibpy.Topic(ros, PROBE_TOPIC, PROBE_TYPE)
+    probe_sub.subscribe(on_probe)
+    print(f"[INFO] Latency echo node on ws://{host}:{port}, Ctrl+C to stop")
+    try:
+        while ros.is_connected:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        probe_sub.unsubscribe()
+        echo_pub.unadvertise()
+        ros.terminate()
+
+
+if __name__ == "__main__":
+    run_echo_node(
+        sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1",
+        int(sys.argv[2]) if len(sys.argv) > 2 else 9090,
+    )
@@ -1,6 +1,5 @@
 import sys
 import os
-import threading
 import requests
 from PyQt5.QtWidgets import (
     QApplication,
@@ -14,16 +13,34 @@ from PyQt5.QtWidgets import (
     QComboBox,
     QSlider,
     QFormLayout,
+    QCheckBox,
 )
-from PyQt5.QtCore import Qt  # 引入 Qt 模塊
+from PyQt5.QtCore import QEvent, Qt, pyqtSignal  # 引入 Qt 模塊
 import yaml
 from PyQt5.QtWidgets import QScrollArea
 import roslibpy  # ← 新增
 import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from discovery import ProfileStore, format_host, scan_sync, validate_host
+from latency import LatencyProbe
+from recorder import OUTGOING, TopicRecorder
+from profiling import ResourceProfiler, profiling_requested
+from script_events import ACTIVE_STATES, ScriptEventChannel
+from teleop import JoystickReader, TeleopMixer
 
 
 class IPInputWindow(QWidget):
+    # 掃描在背景 thread 執行，結果透過 signal 回到 GUI thread
+    scan_finished = pyqtSignal(object, str)  # (results, error)
+    # Connect Best 用已存 profile 時，連線前先單獨確認一次：(result or None, error)
+    best_checked = pyqtSignal(object, str)
+    # run-script 的 HTTP 回應：(generation, script, data, error, elapsed_ms)
+    script_reply = pyqtSignal(int, str, object, str, float)
+    # (generation, ip, roslibpy.Ros or None, error)
+    rosbridge_finished = pyqtSignal(int, str, object, str)
+
     def __init__(self):
         super().__init__()
         self.connected = False
@@ -46,73 +63,284 @@ class IPInputWindow(QWidget):
             config = yaml.safe_load(f)
             self.key_map = config.get("key_mappings", {})
             self.joint_limits = config.get("arm_joint_limits", {})
+            self.recorder_config = config.get("recorder") or {}
+            teleop_config = config.get("teleop") or {}
+
+        # 多鍵 / 搖桿混合，連上 ROSBridge 後才開始 tick
+        self.teleop = TeleopMixer(
+            self.key_map,
+            self._publish_teleop,
+            tick_hz=teleop_config.get("tick_hz", 50),
+            max_speed=teleop_config.get("max_speed", 30),
+            accel=teleop_config.get("accel", 120),
+            decel=teleop_config.get("decel", 240),
+        )
+        gamepad_config = teleop_config.get("gamepad") or {}
+        self.gamepad = (
+            JoystickReader(self.teleop, **gamepad_config)
+            if gamepad_config.get("device")
+            else None
+        )
 
         self.joint_sliders = {}  # key: joint_name, value: slider
 
+        # 背景 HTTP 請求（stop script、掃描）共用同一組 thread，不再每次開新的
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pros")
+        self.profiler = ResourceProfiler()
+
+        # script 狀態：由 /events 推送，server 不支援時以 HTTP 回應為準
+        self.script_states = {}  # script 名稱 -> starting / running / stopped ...
+        self.pending_scripts = set()  # 已送出、尚未收到回應的 run-script
+        self._connecting = None  # (ip, port)，等待 star_car 回應中
+        # 每次斷線 +1；run-script 回應帶著送出時的 generation，不符就是上一個連線的
+        self._script_generation = 0
+        self.events = ScriptEventChannel(self)
+        self.events.event_received.connect(self.on_script_event)
+        self.events.connection_changed.connect(self.on_events_connection_changed)
+        self.script_reply.connect(self.on_script_reply)
+        self.rosbridge_finished.connect(self.on_rosbridge_finished)
+
+        # 最近連線 / 掃描到的機器人
+        self.profiles = ProfileStore(os.path.join(BASE_DIR, "robot_profiles.yaml"))
+        self.scan_results = []
+        self.scan_finished.connect(self.on_scan_finished)
+        self.best_checked.connect(self.on_best_checked)
+
         # ✅ 最後再初始化 UI（要用到 joint_limits）
         self.init_ui()
 
         self.ros = None  # roslibpy.Ros 物件
         self.rosbridge_port = 9090  # 可改成你需要的 port
+        self.rosbridge_timeout = 5
+        self.rosbridge_retries = 5
+        # 每次連線 +1；背景回來的結果 generation 不同就是過時的，直接關掉
+        self._rosbridge_generation = 0
+        self._rosbridge_cancel = threading.Event()
         self.arm_pub = None  # roslibpy.Topic for arm joints
+        self.latency_probe = None  # LatencyProbe，勾選 Latency Probe 時才建立
+        self.recorder = None  # TopicRecorder，錄製中才有值
+        self.record_subs = []  # 錄製用的 roslibpy.Topic 訂閱
+        self.recordings_dir = os.path.join(BASE_DIR, "recordings")
+
+        self._refresh_connect_best()
+
+        if profiling_requested():
+            self.chk_profile.setChecked(True)
 
     def _connect_rosbridge(
-        self, ip: str, port: int = 9090, timeout: int = 5, max_retries: int = 5
+        self,
+        ip: str,
+        port: int = 9090,
+        timeout: int = 5,
+        max_retries: int = 5,
+        cancel: threading.Event = None,
     ):
+        """
+        在背景 thread 執行，回傳 (ros, error)；不碰 self，
+        由 GUI thread 的 on_rosbridge_finished 決定要不要用。
+        """
+        cancel = cancel or threading.Event()
+        # 同一個 Ros 物件重試即可，roslibpy 會在背景自動重連
+        ros = roslibpy.Ros(host=format_host(ip), port=port)
         for attempt in range(1, max_retries + 1):
-            ros = roslibpy.Ros(host=ip, port=port)
+            if cancel.is_set():
+                break
             try:
                 print(
                     f"[INFO] Attempting to connect to ROSBridge (try {attempt}/{max_retries})..."
                 )
                 ros.run(timeout=timeout)
                 if ros.is_connected:
-                    self.ros = ros
-
-                    # wheel publisher
-                    self.wheel_pub = roslibpy.Topic(
-                        self.ros, "/car_C_rear_wheel", "std_msgs/Float32MultiArray"
-                    )
-                    self.wheel_pub.advertise()
-
-                    # ★ arm publisher
-                    self.arm_pub = roslibpy.Topic(
-                        self.ros, "/robot_arm", "trajectory_msgs/JointTrajectoryPoint"
-                    )
-                    self.arm_pub.advertise()
-
                     print(f"[INFO] Connected to ROSBridge on attempt {attempt}")
-                    return True, ""
+                    return ros, ""
                 else:
                     print("[WARN] roslibpy connected=False")
 
             except Exception as e:
                 print(f"[ERROR] ROSBridge connection failed on attempt {attempt}: {e}")
 
-            time.sleep(1)  # 每次間隔 1 秒再嘗試
+            if cancel.wait(1):  # 每次間隔 1 秒再嘗試，斷線時立刻放棄
+                break
 
-        return False, f"Failed to connect after {max_retries} attempts"
+        self._close_ros(ros)
+        if cancel.is_set():
+            return None, "cancelled"
+        return None, f"Failed to connect after {max_retries} attempts"
 
-    def _disconnect_rosbridge(self):
-        if self.wheel_pub:
-            try:
-                self.wheel_pub.unadvertise()
-            except:
-                pass
-            self.wheel_pub = None
+    def _install_ros(self, ros):
+        """GUI thread：採用連上的 Ros 並建立 publisher"""
+        self.ros = ros
 
-        if self.arm_pub:
-            try:
-                self.arm_pub.unadvertise()
-            except:
-                pass
-            self.arm_pub = None
+        # wheel publisher
+        self.wheel_pub = roslibpy.Topic(
+            self.ros, "/car_C_rear_wheel", "std_msgs/Float32MultiArray"
+        )
+        self.wheel_pub.advertise()
 
-        if self.ros and self.ros.is_connected:
+        # ★ arm publisher
+        self.arm_pub = roslibpy.Topic(
+            self.ros, "/robot_arm", "trajectory_msgs/JointTrajectoryPoint"
+        )
+        self.arm_pub.advertise()
+
+    @staticmethod
+    def _close_ros(ros):
+        """
+        關閉連線並停止自動重連。
+        不用 ros.terminate()：它會停掉 twisted reactor，之後就無法再連線。
+        """
+        try:
+            ros.factory.stopTrying()
+            if ros.is_connected:
+                ros.close()
+        except Exception as e:
+            print(f"[WARN] Failed to close ROSBridge connection: {e}")
+
+    def _start_latency_probe(self):
+        if self.latency_probe is None and self.ros and self.ros.is_connected:
+            self.latency_probe = LatencyProbe(self.ros)
+            self.latency_probe.start()
+            print("[INFO] Latency probe started")
+
+    def _stop_latency_probe(self):
+        if self.latency_probe is not None:
+            self.latency_probe.stop()
+            print(f"[INFO] Latency report:\n{self.latency_probe.report()}")
+            self.latency_probe = None
+
+    def on_latency_probe_toggled(self, checked):
+        if checked:
+            self._start_latency_probe()
+        else:
+            self._stop_latency_probe()
+
+    def on_latency_report_click(self):
+        if self.latency_probe is None:
+            QMessageBox.information(self, "Latency", "Latency probe is not running.")
+            return
+        QMessageBox.information(self, "Latency", self.latency_probe.report())
+
+    def on_record_click(self):
+        if self.recorder is None:
+            self._start_recording()
+        else:
+            self._stop_recording()
+
+    def _start_recording(self):
+        if not (self.ros and self.ros.is_connected):
+            QMessageBox.warning(self, "Warning", "ROSBridge not connected.")
+            return
+        os.makedirs(self.recordings_dir, exist_ok=True)
+        path = os.path.join(
+            self.recordings_dir, time.strftime("pros_%Y%m%d_%H%M%S.plog")
+        )
+        try:
+            self.recorder = TopicRecorder(
+                path, max_queue=self.recorder_config.get("max_queue", 100000)
+            )
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to start recording: {e}")
+            return
+
+        recorder = self.recorder
+        for item in self.recorder_config.get("topics", []):
+            topic = roslibpy.Topic(self.ros, item["name"], item["type"])
+            topic.subscribe(lambda m, name=item["name"]: recorder.record(name, m))
+            self.record_subs.append(topic)
+        self.btn_record.setText("Stop Recording")
+        print(f"[INFO] Recording to {path}")
+
+    def _stop_recording(self):
+        if self.recorder is None:
+            return
+        for topic in self.record_subs:
             try:
-                self.ros.terminate()
-            except:
-                pass
+                topic.unsubscribe()
+            except Exception as e:
+                print(f"[WARN] Failed to unsubscribe {topic.name}: {e}")
+        self.record_subs = []
+        recorder = self.recorder
+        recorder.close()
+        print(
+            f"[INFO] Recorded {recorder.records} messages "
+            f"({recorder.bytes_written / 1e6:.1f} MB) to {recorder.path}"
+        )
+        if recorder.dropped:
+            print(f"[WARN] Recorder dropped {recorder.dropped} messages")
+        self.recorder = None
+        if recorder.error:
+            QMessageBox.warning(
+                self, "Recording", f"Recording stopped early: {recorder.error}"
+            )
+        self.btn_record.setText("Start Recording")
+
+    def _record_outgoing(self, topic: str, msg):
+        # 可能在 teleop thread 執行，GUI thread 隨時會把 self.recorder 設成 None
+        recorder = self.recorder
+        if recorder is not None and self.recorder_config.get("record_outgoing", True):
+            recorder.record(topic, msg, OUTGOING)
+
+    def _stamp_latency(self, topic: str):
+        probe = self.latency_probe  # 同上，只讀一次
+        if probe is not None:
+            probe.stamp(topic)
+
+    def on_profile_toggled(self, checked):
+        if checked:
+            self.profiler.start()
+        else:
+            self.profiler.stop()
+
+    def on_profile_report_click(self):
+        if not self.profiler.running:
+            QMessageBox.information(self, "Profiling", "Profiling is not running.")
+            return
+        self.profiler.sample()
+        QMessageBox.information(self, "Profiling", self.profiler.report())
+
+    def closeEvent(self, event):
+        # 只關掉本機資源，robot 上的服務維持原狀
+        self.events.stop()
+        self._disconnect_rosbridge()
+        self.profiler.stop()
+        # 不等還在重試的 ROSBridge 連線（已在 _disconnect_rosbridge 取消）
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
+    def _start_teleop(self):
+        self.teleop.start()
+        if self.gamepad is not None:
+            self.gamepad.start()
+
+    def _stop_teleop(self):
+        if self.gamepad is not None:
+            self.gamepad.stop()
+        self.teleop.stop()
+
+    def _publish_teleop(self, speeds):
+        # 在 teleop tick thread 執行；斷線時安靜跳過，不要每個 tick 印警告
+        self.publish_wheel_speed(speeds, warn=False)
+
+    def _disconnect_rosbridge(self):
+        # 讓還在背景重試的連線放棄，晚到的結果也會因 generation 不符被關掉
+        self._rosbridge_generation += 1
+        self._rosbridge_cancel.set()
+        # 必須在 unadvertise / close 之前，teleop 停止時的全零命令才送得出去
+        self._stop_teleop()
+        self._stop_recording()
+        self._stop_latency_probe()
+
+        for pub in (self.wheel_pub, self.arm_pub):
+            if pub:
+                try:
+                    pub.unadvertise()
+                except Exception as e:
+                    print(f"[WARN] Failed to unadvertise {pub.name}: {e}")
+        self.wheel_pub = None
+        self.arm_pub = None
+
+        if self.ros:
+            self._close_ros(self.ros)
         self.ros = None
 
     def publish_robot_arm(self, joint_values):
@@ -125,7 +353,8 @@ class IPInputWindow(QWidget):
         float64[] effort
         duration  time_from_start
         """
-        if not (self.ros and self.ros.is_connected and self.arm_pub):
+        ros, arm_pub = self.ros, self.arm_pub
+        if not (ros and ros.is_connected and arm_pub):
             print("[WARN] ROS not connected, skip robot_arm publish.")
             return
 
@@ -138,17 +367,26 @@ class IPInputWindow(QWidget):
                 "time_from_start": {"secs": 0, "nsecs": 0},
             }
         )
-        self.arm_pub.publish(msg)
+        arm_pub.publish(msg)
+        self._record_outgoing("/robot_arm", msg)
+        self._stamp_latency("/robot_arm")
 
-    def publish_wheel_speed(self, speeds):
-        """speeds: list[float or int]"""
-        if not (self.ros and self.ros.is_connected and self.wheel_pub):
-            print("[WARN] ROS not connected, skip publish.")
+    def publish_wheel_speed(self, speeds, warn: bool = True):
+        """
+        speeds: list[float or int]
+        teleop tick thread 也會呼叫，self 上的屬性都先讀進 local 再用
+        """
+        ros, wheel_pub = self.ros, self.wheel_pub
+        if not (ros and ros.is_connected and wheel_pub):
+            if warn:
+                print("[WARN] ROS not connected, skip publish.")
             return
         msg = roslibpy.Message(
             {"layout": {"dim": [], "data_offset": 0}, "data": list(map(float, speeds))}
         )
-        self.wheel_pub.publish(msg)
+        wheel_pub.publish(msg)
+        self._record_outgoing("/car_C_rear_wheel", msg)
+        self._stamp_latency("/car_C_rear_wheel")
 
     def send_joint_command(self):
         if not self.connected:
@@ -181,7 +419,7 @@ class IPInputWindow(QWidget):
         # IP input area
         ip_label = QLabel("Server IP:", self)
         self.ip_edit = QLineEdit(self)
-        self.ip_edit.setPlaceholderText("e.g. 192.168.0.10")
+        self.ip_edit.setPlaceholderText("e.g. 192.168.0.10, robot.local or 192.168.0.0/24")
         ip_layout = QHBoxLayout()
         ip_layout.addWidget(ip_label)
         ip_layout.addWidget(self.ip_edit)
@@ -198,6 +436,24 @@ class IPInputWindow(QWidget):
         self.btn_connect = QPushButton("Connect", self)
         self.btn_connect.clicked.connect(self.on_connect_click)
 
+        # Discovery：掃描網段 / 最近連線 / 一鍵連最佳
+        self.btn_scan = QPushButton("Scan", self)
+        self.btn_scan.setToolTip(
+            "Scan the subnet or hosts typed in Server IP "
+            "(e.g. 192.168.0.0/24, robot.local). Empty scans the local /24."
+        )
+        self.btn_scan.clicked.connect(self.on_scan_click)
+        self.profile_combo = QComboBox(self)
+        self.profile_combo.activated.connect(self.on_profile_selected)
+        self.btn_connect_best = QPushButton("Connect Best", self)
+        self.btn_connect_best.clicked.connect(self.on_connect_best_click)
+        self.btn_connect_best.setEnabled(False)
+        discovery_layout = QHBoxLayout()
+        discovery_layout.addWidget(self.btn_scan)
+        discovery_layout.addWidget(self.profile_combo, 1)
+        discovery_layout.addWidget(self.btn_connect_best)
+        self.refresh_profile_combo()
+
         # LIDAR selection (ComboBox)
         lidar_label = QLabel("Select LIDAR:", self)
         self.lidar_combo = QComboBox(self)
@@ -229,10 +485,42 @@ class IPInputWindow(QWidget):
         self.btn_reset.clicked.connect(self.on_reset_click)
         self.btn_reset.setVisible(False)
 
+        # Latency probe：指令附帶 probe，對照 echo topic 算延遲
+        self.chk_latency = QCheckBox("Latency Probe", self)
+        self.chk_latency.setChecked(os.environ.get("PROS_LATENCY_PROBE") == "1")
+        self.chk_latency.toggled.connect(self.on_latency_probe_toggled)
+        self.btn_latency_report = QPushButton("Latency Report", self)
+        self.btn_latency_report.clicked.connect(self.on_latency_report_click)
+
+        # Topic recorder
+        self.btn_record = QPushButton("Start Recording", self)
+        self.btn_record.clicked.connect(self.on_record_click)
+
+        self.tools_widget = QWidget(self)
+        tools_layout = QHBoxLayout(self.tools_widget)
+        tools_layout.setContentsMargins(0, 0, 0, 0)
+        tools_layout.addWidget(self.chk_latency)
+        tools_layout.addWidget(self.btn_latency_report)
+        tools_layout.addWidget(self.btn_record)
+        self.tools_widget.setVisible(False)
+
         # Current IP label
         self.current_ip_label = QLabel("", self)
         self.current_ip_label.setVisible(False)
 
+        # Script 狀態 / 最新 log
+        self.script_status_label = QLabel("", self)
+        self.script_status_label.setVisible(False)
+
+        # Profiling（也可用環境變數 PROS_PROFILE=1 開啟）
+        self.chk_profile = QCheckBox("Profiling", self)
+        self.chk_profile.toggled.connect(self.on_profile_toggled)
+        self.btn_profile_report = QPushButton("Profile Report", self)
+        self.btn_profile_report.clicked.connect(self.on_profile_report_click)
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(self.chk_profile)
+        profile_layout.addWidget(self.btn_profile_report)
+
         # Key display
         self.key_label = QLabel("Press a key", self)
         self.key_label.setAlignment(Qt.AlignCenter)
@@ -243,6 +531,7 @@ class IPInputWindow(QWidget):
         layout.addLayout(ip_layout)
         layout.addLayout(port_layout)
         layout.addWidget(self.btn_connect)
+        layout.addLayout(discovery_layout)
         layout.addWidget(lidar_label)
         layout.addWidget(self.lidar_combo)  # Add the lidar combo box here
         layout.addWidget(self.btn_slam)
@@ -263,8 +552,11 @@ class IPInputWindow(QWidget):
         layout.addWidget(self.btn_yolo)
 
         layout.addWidget(self.btn_reset)
+        layout.addWidget(self.tools_widget)
         layout.addWidget(self.current_ip_label)
+        layout.addWidget(self.script_status_label)
         layout.addWidget(self.key_label)
+        layout.addLayout(profile_layout)
 
         self.btn_reset_joints = QPushButton("Reset Joints", self)
         self.btn_reset_joints.clicked.connect(self.reset_all_joint_sliders)
@@ -314,124 +606,74 @@ class IPInputWindow(QWidget):
         layout.addWidget(self.btn_reset_joints)
 
     def keyPressEvent(self, event):
-        if self.connected:
-            key = event.text()
+        # 只記錄按住哪些鍵，輪速由 teleop tick 混合後送出；autorepeat 不用處理
+        if self.connected and not event.isAutoRepeat():
+            key = event.text().lower()
             if key:
                 self.key_label.setText(f"Key Pressed: {key}")
-                if key in self.key_map:
-                    wheel_speed = self.key_map[key]  # list
-                    # ★ 用 roslibpy 發
-                    self.publish_wheel_speed(wheel_speed)
-                else:
+                if not self.teleop.press(key):
                     self.key_label.setText(f"Key '{key}' not mapped.")
 
-    def on_camera_click(self):
-        ip = self.current_ip
-        port = self.current_port
+    def keyReleaseEvent(self, event):
+        if not event.isAutoRepeat():
+            key = event.text().lower()
+            if key:
+                self.teleop.release(key)
+
+    def changeEvent(self, event):
+        # 視窗失去焦點時收不到 key release，全部放開避免車子一直跑
+        if event.type() == QEvent.ActivationChange and not self.isActiveWindow():
+            self.teleop.release_all()
+        super().changeEvent(event)
 
-        if not ip:
+    def on_camera_click(self):
+        if not self.current_ip:
             QMessageBox.warning(self, "Warning", "IP not connected.")
             return
+        if self._script_state("camera") == "starting":
+            return
 
         if not self.camera_active:
             # 開啟 Camera
-            url = f"http://{ip}:{port}/run-script/camera"
-            try:
-                resp = requests.get(url, timeout=5)
-                data = resp.json()
-                msg = data.get("message", "")
-
-                if (
-                    data.get("status") == "Script execution started"
-                    or "already active" in msg
-                    or "already running" in msg
-                ):
-                    self.camera_active = True
-                    self.btn_camera.setText("Close Camera")
-                    self.btn_yolo.setVisible(True)  # 顯示 YOLO 按鈕
-                    self.btn_yolo.setEnabled(True)  # 啟用 YOLO 按鈕
-
-                    info = (
-                        "Camera started."
-                        if data.get("status") == "Script execution started"
-                        else "Camera already running."
-                    )
-                    QMessageBox.information(self, "Info", info)
-                else:
-                    QMessageBox.warning(
-                        self, "Warning", f"Failed to start camera: {msg}"
-                    )
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to start camera: {e}")
+            self._apply_script_state("camera", "starting")
+            self._start_script("camera")
         else:
             # 關閉 Camera
-            self.camera_active = False
-            self.btn_camera.setText("Open Camera")
-            self.btn_yolo.setVisible(False)  # 隱藏 YOLO 按鈕
-
+            ip, port = self.current_ip, self.current_port
             # 如果 YOLO 正在運行，也要關閉它
             if self.yolo_active:
-                self.yolo_active = False
-                self.btn_yolo.setText("Open YOLO")
-                threading.Thread(target=self._send_yolo_stop, args=(ip, port)).start()
-
-            threading.Thread(target=self._send_camera_stop, args=(ip, port)).start()
+                self._apply_script_state("yolo", "stopped")
+                self.executor.submit(self._send_yolo_stop, ip, port)
+            self._apply_script_state("camera", "stopped")
+            self.executor.submit(self._send_camera_stop, ip, port)
 
     def on_yolo_click(self):
-        ip = self.current_ip
-        port = self.current_port
-
-        if not ip:
+        if not self.current_ip:
             QMessageBox.warning(self, "Warning", "IP not connected.")
             return
 
         if not self.camera_active:
             QMessageBox.warning(self, "Warning", "Camera must be started first.")
             return
+        if self._script_state("yolo") == "starting":
+            return
 
         if not self.yolo_active:
             # 開啟 YOLO
-            url = f"http://{ip}:{port}/run-script/yolo"
-            try:
-                resp = requests.get(url, timeout=5)
-                data = resp.json()
-                msg = data.get("message", "")
-
-                if (
-                    data.get("status") == "Script execution started"
-                    or "already active" in msg
-                    or "already running" in msg
-                ):
-                    self.yolo_active = True
-                    self.btn_yolo.setText("Close YOLO")
-
-                    info = (
-                        "YOLO started."
-                        if data.get("status") == "Script execution started"
-                        else "YOLO already running."
-                    )
-                    QMessageBox.information(self, "Info", info)
-                else:
-                    QMessageBox.warning(self, "Warning", f"Failed to start YOLO: {msg}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to start YOLO: {e}")
+            self._apply_script_state("yolo", "starting")
+            self._start_script("yolo")
         else:
             # 關閉 YOLO
-            self.yolo_active = False
-            self.btn_yolo.setText("Open YOLO")
-            threading.Thread(target=self._send_yolo_stop, args=(ip, port)).start()
+            self._apply_script_state("yolo", "stopped")
+            self.executor.submit(
+                self._send_yolo_stop, self.current_ip, self.current_port
+            )
 
     def _send_yolo_stop(self, ip: str, port: int):
-        try:
-            requests.get(f"http://{ip}:{port}/run-script/yolo_stop", timeout=5)
-        except:
-            pass
+        self._send_stop(ip, port, "yolo_stop")
 
     def _send_camera_stop(self, ip: str, port: int):
-        try:
-            requests.get(f"http://{ip}:{port}/run-script/camera_stop", timeout=5)
-        except:
-            pass
+        self._send_stop(ip, port, "camera_stop")
 
     def send_wheel_command(self, url):
         try:
@@ -446,14 +688,17 @@ class IPInputWindow(QWidget):
         Update the selected LIDAR type based on the combo box selection.
         """
         self.selected_lidar = self.lidar_combo.currentText()
+        if self.connected:
+            self._refresh_script_buttons()
 
     def on_connect_click(self):
         ip = self.ip_edit.text().strip()
         port_text = self.port_edit.text().strip()
 
         if not self.validate_ip(ip):
-            QMessageBox.warning(self, "Warning", "Invalid IP format.")
+            QMessageBox.warning(self, "Warning", "Invalid IP or hostname.")
             return
+        ip = ip.strip("[]")
 
         # Port 預設 5000
         if not port_text:
@@ -467,53 +712,13 @@ class IPInputWindow(QWidget):
 
         # －－－－－－－－ Connect 邏輯 －－－－－－－－#
         if not self.connected:
-            url = f"http://{ip}:{port}/run-script/star_car"
-            try:
-                resp = requests.get(url, timeout=5)
-                data = resp.json()
-                msg = data.get("message", "")
-
-                if (
-                    data.get("status") == "Script execution started"
-                    or "already active" in msg
-                    or "Containers for 'star_car' already running" in msg
-                ):
-                    # 設定已連線狀態
-                    self._set_connected(ip, port)
-
-                    # 嘗試連 rosbridge
-                    ok, err = self._connect_rosbridge(
-                        ip, self.rosbridge_port, timeout=5
-                    )
-                    if ok:
-                        QMessageBox.information(
-                            self,
-                            "ROSBridge",
-                            f"Connected to ws://{ip}:{self.rosbridge_port}",
-                        )
-                    else:
-                        QMessageBox.warning(
-                            self,
-                            "ROSBridge",
-                            f"ROSBridge connect failed: {err}",
-                        )
-
-                    info = (
-                        "Connected and services started."
-                        if data.get("status") == "Script execution started"
-                        else "Already connected."
-                    )
-                    QMessageBox.information(self, "Info", info)
-
-                    # 顯示 LIDAR 選擇
-                    self.lidar_combo.setVisible(True)
-                    self.lidar_label.setVisible(True)
-
-                else:
-                    QMessageBox.warning(self, "Warning", f"Server error: {msg}")
-
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to connect: {e}")
+            if self._connecting:
+                return
+            # 不阻塞 GUI，結果在 on_script_reply → _on_connect_reply 處理
+            self._connecting = (ip, port)
+            self.btn_connect.setEnabled(False)
+            self.btn_connect.setText("Connecting...")
+            self._start_script("star_car", ip, port)
 
         # －－－－－－－－ Disconnect 邏輯 －－－－－－－－#
         else:
@@ -521,125 +726,352 @@ class IPInputWindow(QWidget):
             # 先更新 UI 狀態
             self._set_disconnected()
             # 發出 stop
-            threading.Thread(target=self._send_starcar_stop, args=(ip0, port0)).start()
+            self.executor.submit(self._send_starcar_stop, ip0, port0)
+
+    def _on_connect_reply(self, data: dict, error: str, elapsed_ms: float):
+        ip, port = self._connecting
+        self._connecting = None
+        self.btn_connect.setEnabled(True)
+        self.btn_connect.setText("Connect")
+
+        if error:
+            QMessageBox.critical(self, "Error", f"Failed to connect: {error}")
+            return
+
+        msg = data.get("message", "")
+        if (
+            data.get("status") == "Script execution started"
+            or "already active" in msg
+            or "Containers for 'star_car' already running" in msg
+        ):
+            # 設定已連線狀態
+            self._set_connected(ip, port)
+            # HTTP 來回和掃描的 TCP 連線時間不能比，另存 connect_ms
+            self.profiles.record(ip, port, connect_ms=elapsed_ms)
+            self.profiles.save()
+            self.refresh_profile_combo()
+
+            # script 狀態改由 /events 推送
+            self.events.start(ip, port)
+
+            # 嘗試連 rosbridge（會重試，放到背景）
+            self._rosbridge_generation += 1
+            self._rosbridge_cancel = threading.Event()
+            self.executor.submit(
+                self._rosbridge_worker,
+                self._rosbridge_generation,
+                ip,
+                self._rosbridge_cancel,
+            )
+
+            info = (
+                "Connected and services started."
+                if data.get("status") == "Script execution started"
+                else "Already connected."
+            )
+            QMessageBox.information(self, "Info", info)
+
+            # 顯示 LIDAR 選擇
+            self.lidar_combo.setVisible(True)
+            self.lidar_label.setVisible(True)
+        else:
+            QMessageBox.warning(self, "Warning", f"Server error: {msg}")
+
+    def _rosbridge_worker(self, generation: int, ip: str, cancel: threading.Event):
+        ros, err = self._connect_rosbridge(
+            ip,
+            self.rosbridge_port,
+            timeout=self.rosbridge_timeout,
+            max_retries=self.rosbridge_retries,
+            cancel=cancel,
+        )
+        self.rosbridge_finished.emit(generation, ip, ros, err)
+
+    def on_rosbridge_finished(self, generation: int, ip: str, ros, err: str):
+        if generation != self._rosbridge_generation or not self.connected:
+            # 連線期間使用者已 Disconnect 或改連別台，這個結果已過時
+            if ros is not None:
+                self._close_ros(ros)
+            return
+        if ros is not None:
+            self._install_ros(ros)
+            self._start_teleop()
+            # 手動連上的機器人也要能出現在 Connect Best
+            self.profiles.record(ip, self.current_port, rosbridge_ok=True)
+            self.profiles.save()
+            self.refresh_profile_combo()
+            self._refresh_connect_best()
+            if self.chk_latency.isChecked():
+                self._start_latency_probe()
+            QMessageBox.information(
+                self,
+                "ROSBridge",
+                f"Connected to ws://{format_host(ip)}:{self.rosbridge_port}",
+            )
+        else:
+            QMessageBox.warning(
+                self,
+                "ROSBridge",
+                f"ROSBridge connect failed: {err}",
+            )
 
     def on_slam_click(self):
+        # 根據 selected_lidar 動態決定 script
+        script = f"slam_{self.selected_lidar}"
+        if self._script_state(script) == "starting":
+            return
         if not self.slam_active:
-            # 根據 selected_lidar 動態修改 URL
-            url = f"http://{self.current_ip}:{self.current_port}/run-script/slam_{self.selected_lidar}"
-            try:
-                resp = requests.get(url, timeout=5)
-                if resp.json().get("status") == "Script execution started":
-                    self.slam_active = True
-                    self.btn_slam.setText("Close Slam")
-                    self.btn_loc.setEnabled(False)
-                    self.btn_store_map.setEnabled(True)
-                    QMessageBox.information(self, "Info", "Slam started.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to start slam: {e}")
+            self._apply_script_state(script, "starting")
+            self._start_script(script)
         else:
-            self.slam_active = False
-            self.btn_slam.setText("Slam")
-            self.btn_loc.setEnabled(True)
-            self.btn_store_map.setEnabled(False)
-            threading.Thread(
-                target=self._send_slam_stop, args=(self.current_ip, self.current_port)
-            ).start()
+            self._apply_script_state(script, "stopped")
+            self.executor.submit(
+                self._send_slam_stop, self.current_ip, self.current_port
+            )
 
     def on_store_map_click(self):
-        url = f"http://{self.current_ip}:{self.current_port}/run-script/store_map"
-        try:
-            resp = requests.get(url, timeout=5)
-            data = resp.json()
-            msg = data.get("message", "")
-            if data.get("status") == "Script execution started":
-                QMessageBox.information(self, "Info", "Store Map signal sent.")
-            else:
-                QMessageBox.warning(self, "Warning", f"Server error: {msg}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to store map: {e}")
+        if self._script_state("store_map") in ACTIVE_STATES:
+            return
+        self._apply_script_state("store_map", "starting")
+        self._start_script("store_map")
 
     def on_loc_click(self):
+        # 根據 selected_lidar 動態決定 script
+        script = f"localization_{self.selected_lidar}"
+        if self._script_state(script) == "starting":
+            return
         if not self.loc_active:
-            # 根據 selected_lidar 動態修改 URL
-            url = f"http://{self.current_ip}:{self.current_port}/run-script/localization_{self.selected_lidar}"
-            try:
-                resp = requests.get(url, timeout=5)
-                if resp.json().get("status") == "Script execution started":
-                    self.loc_active = True
-                    self.btn_loc.setText("Close Localization")
-                    self.btn_slam.setEnabled(False)
-                    self.btn_store_map.setEnabled(False)
-                    QMessageBox.information(self, "Info", "Localization started.")
-            except Exception as e:
-                QMessageBox.critical(
-                    self, "Error", f"Failed to start localization: {e}"
-                )
+            self._apply_script_state(script, "starting")
+            self._start_script(script)
         else:
-            self.loc_active = False
-            self.btn_loc.setText("Localization")
-            self.btn_slam.setEnabled(True)
-            self.btn_store_map.setEnabled(self.slam_active)
-            threading.Thread(
-                target=self._send_loc_stop, args=(self.current_ip, self.current_port)
-            ).start()
+            self._apply_script_state(script, "stopped")
+            self.executor.submit(
+                self._send_loc_stop, self.current_ip, self.current_port
+            )
 
     def on_reset_click(self):
-        self.slam_active = False
-        self.btn_slam.setText("Slam")
-        self.btn_slam.setEnabled(True)
-        self.loc_active = False
-        self.btn_loc.setText("Localization")
-        self.btn_loc.setEnabled(True)
-        self.btn_store_map.setEnabled(False)
+        self._apply_script_state(f"slam_{self.selected_lidar}", "stopped")
+        self._apply_script_state(f"localization_{self.selected_lidar}", "stopped")
         # stop slam & loc
         ip0, port0 = self.current_ip, self.current_port
-        threading.Thread(target=self._send_slam_stop, args=(ip0, port0)).start()
-        threading.Thread(target=self._send_loc_stop, args=(ip0, port0)).start()
-        # 重新發送 star_car 請求以重啟服務
-        # 直接發送 star_car 請求，而不觸發其他狀態改變
-        url = f"http://{ip0}:{port0}/run-script/star_car"
+        self.executor.submit(self._send_slam_stop, ip0, port0)
+        self.executor.submit(self._send_loc_stop, ip0, port0)
+        # 重新發送 star_car 請求以重啟服務，回應在 on_script_reply 處理
+        self._start_script("star_car")
+
+        # 保持畫面原來的狀態
+        QMessageBox.information(self, "Info", "Reset signals sent.")
+
+    # －－－－－－－－ Script 啟動與狀態 －－－－－－－－#
+    def _start_script(self, script: str, ip: str = "", port: int = 0):
+        """背景送出 run-script，回應由 script_reply signal 帶回 GUI thread"""
+        if script in self.pending_scripts:
+            return  # 已送出，避免重複請求
+        self.pending_scripts.add(script)
+        self.executor.submit(
+            self._run_script_worker,
+            self._script_generation,
+            ip or self.current_ip,
+            port or self.current_port,
+            script,
+        )
+
+    def _run_script_worker(self, generation: int, ip: str, port: int, script: str):
+        url = f"http://{format_host(ip)}:{port}/run-script/{script}"
         try:
             resp = requests.get(url, timeout=5)
             data = resp.json()
-            msg = data.get("message", "")
-            if (
-                data.get("status") == "Script execution started"
-                or "already active" in msg
-            ):
+        except (requests.RequestException, ValueError) as e:
+            self.script_reply.emit(generation, script, {}, str(e), 0.0)
+            return
+        self.script_reply.emit(
+            generation, script, data, "", resp.elapsed.total_seconds() * 1000.0
+        )
+
+    def on_script_reply(
+        self, generation: int, script: str, data: dict, error: str, elapsed_ms
+    ):
+        if generation != self._script_generation:
+            return  # 上一個連線送出的請求，不能改到現在這台的按鈕
+        self.pending_scripts.discard(script)
+        if script == "star_car" and self._connecting:
+            self._on_connect_reply(data, error, elapsed_ms)
+            return
+        if not self.connected:
+            return  # 已斷線，忽略過時的回應
+
+        name = self._script_title(script)
+        msg = data.get("message", "")
+        started = data.get("status") == "Script execution started"
+        already = "already active" in msg or "already running" in msg
+
+        if script == "star_car":
+            # Reset 重送的 star_car
+            if error:
+                QMessageBox.critical(
+                    self, "Error", f"Failed to restart service: {error}"
+                )
+            elif started or already:
                 QMessageBox.information(self, "Info", "Service restarted successfully.")
             else:
                 QMessageBox.warning(self, "Warning", f"Server error: {msg}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to restart service: {e}")
+            return
 
-        # 保持畫面原來的狀態
-        QMessageBox.information(self, "Info", "Reset signals sent.")
+        if error:
+            self._apply_script_state(script, "failed")
+            QMessageBox.critical(self, "Error", f"Failed to start {name}: {error}")
+        elif already:
+            self._apply_script_state(script, "running")
+        elif started:
+            # 有 /events 時等事件確認實際狀態；沒有時以 HTTP 回應為準
+            if not self.events.connected:
+                if script == "store_map":
+                    self._apply_script_state(script, "exited")
+                    QMessageBox.information(self, "Info", "Store Map signal sent.")
+                else:
+                    self._apply_script_state(script, "running")
+        else:
+            self._apply_script_state(script, "failed")
+            QMessageBox.warning(self, "Warning", f"Failed to start {name}: {msg}")
+
+    def on_script_event(self, event: dict):
+        if not self.connected:
+            return
+        kind = event.get("type")
+        if kind == "snapshot":
+            scripts = event.get("scripts") or {}
+            # snapshot 沒列出的 script 都視為沒在跑
+            for script in list(self.script_states):
+                if script not in scripts and script not in self.pending_scripts:
+                    self.script_states[script] = "stopped"
+            self.script_states.update(scripts)
+            self._follow_active_lidar(scripts)
+            self._refresh_script_buttons()
+        elif kind == "state":
+            script, state = event.get("script"), event.get("state")
+            if not script or not state:
+                return
+            prev = self._script_state(script)
+            self._follow_active_lidar({script: state})
+            self._apply_script_state(script, state)
+
+            text = f"{self._script_title(script)}: {state}"
+            if event.get("code") is not None:
+                text += f" (exit code {event['code']})"
+            self.script_status_label.setText(text)
+            if state == "failed":
+                QMessageBox.warning(self, "Warning", text)
+            elif script == "store_map" and state == "exited" and prev == "starting":
+                QMessageBox.information(self, "Info", "Map stored.")
+        elif kind == "log":
+            line = f"[{event.get('script', '?')}] {event.get('line', '')}"
+            print(line)
+            self.script_status_label.setText(line)
+
+    def on_events_connection_changed(self, live: bool):
+        self.script_status_label.setText(
+            "Script events: live"
+            if live
+            else "Script events: offline (using HTTP replies)"
+        )
+
+    def _follow_active_lidar(self, scripts: dict):
+        # robot 上跑的是另一顆 LiDAR 的 slam / localization 時，切換下拉選單
+        for script, state in scripts.items():
+            if state not in ACTIVE_STATES:
+                continue
+            if script.startswith(("slam_", "localization_")):
+                lidar = script.split("_", 1)[1]
+                known = self.lidar_combo.findText(lidar) >= 0
+                if known and lidar != self.selected_lidar:
+                    self.lidar_combo.setCurrentText(lidar)
+
+    @staticmethod
+    def _script_title(script: str) -> str:
+        if script.startswith("slam_"):
+            return "Slam"
+        if script.startswith("localization_"):
+            return "Localization"
+        return {
+            "camera": "Camera",
+            "yolo": "YOLO",
+            "store_map": "Store Map",
+            "star_car": "Service",
+        }.get(script, script)
+
+    def _script_state(self, script: str) -> str:
+        return self.script_states.get(script, "stopped")
+
+    def _apply_script_state(self, script: str, state: str):
+        self.script_states[script] = state
+        self._refresh_script_buttons()
+
+    def _refresh_script_buttons(self):
+        """依 script_states 更新所有功能按鈕，畫面永遠跟 robot 上的狀態一致"""
+        lidar = self.selected_lidar
+        slam = self._script_state(f"slam_{lidar}")
+        loc = self._script_state(f"localization_{lidar}")
+        camera = self._script_state("camera")
+        yolo = self._script_state("yolo")
+        store = self._script_state("store_map")
+
+        self.slam_active = slam in ACTIVE_STATES
+        self.loc_active = loc in ACTIVE_STATES
+        self.camera_active = camera in ACTIVE_STATES
+        self.yolo_active = yolo in ACTIVE_STATES
+
+        if slam == "starting":
+            self.btn_slam.setText("Starting Slam...")
+        else:
+            self.btn_slam.setText("Close Slam" if self.slam_active else "Slam")
+        self.btn_slam.setEnabled(slam != "starting" and not self.loc_active)
+
+        if loc == "starting":
+            self.btn_loc.setText("Starting Localization...")
+        else:
+            self.btn_loc.setText(
+                "Close Localization" if self.loc_active else "Localization"
+            )
+        self.btn_loc.setEnabled(loc != "starting" and not self.slam_active)
+
+        storing = store in ACTIVE_STATES
+        self.btn_store_map.setText("Storing Map..." if storing else "Store Map")
+        self.btn_store_map.setEnabled(slam == "running" and not storing)
+
+        if camera == "starting":
+            self.btn_camera.setText("Starting Camera...")
+        else:
+            self.btn_camera.setText(
+                "Close Camera" if self.camera_active else "Open Camera"
+            )
+        self.btn_camera.setEnabled(camera != "starting")
+
+        # YOLO 按鈕只有 camera 開啟時才顯示
+        self.btn_yolo.setVisible(self.connected and self.camera_active)
+        if yolo == "starting":
+            self.btn_yolo.setText("Starting YOLO...")
+        else:
+            self.btn_yolo.setText("Close YOLO" if self.yolo_active else "Open YOLO")
+        self.btn_yolo.setEnabled(camera == "running" and yolo != "starting")
 
     # -- stop functions 都帶入 port --
-    def _send_slam_stop(self, ip: str, port: int):
+    def _send_stop(self, ip: str, port: int, script: str):
+        url = f"http://{format_host(ip)}:{port}/run-script/{script}"
         try:
-            requests.get(
-                f"http://{ip}:{port}/run-script/slam_{self.selected_lidar}_stop",
-                timeout=5,
-            )
-        except:
-            pass
+            resp = requests.get(url, timeout=5)
+            if resp.status_code != 200:
+                print(f"[WARN] {script}: {resp.status_code} - {resp.text}")
+        except requests.RequestException as e:
+            print(f"[WARN] Failed to send {script}: {e}")
+
+    def _send_slam_stop(self, ip: str, port: int):
+        self._send_stop(ip, port, f"slam_{self.selected_lidar}_stop")
 
     def _send_loc_stop(self, ip: str, port: int):
-        try:
-            requests.get(
-                f"http://{ip}:{port}/run-script/localization_{self.selected_lidar}_stop",
-                timeout=5,
-            )
-        except:
-            pass
+        self._send_stop(ip, port, f"localization_{self.selected_lidar}_stop")
 
     def _send_starcar_stop(self, ip: str, port: int):
-        try:
-            requests.get(f"http://{ip}:{port}/run-script/star_car_stop", timeout=5)
-        except:
-            pass
+        self._send_stop(ip, port, "star_car_stop")
 
     # UI 更新並記錄 port
     def _set_connected(self, ip: str, port: int):
@@ -651,35 +1083,32 @@ class IPInputWindow(QWidget):
         self.ip_edit.setEnabled(False)
         self.port_edit.setEnabled(False)
         self.btn_connect.setText("Disconnect")
+        self._refresh_connect_best()
         self.btn_slam.setVisible(True)
-        self.btn_slam.setEnabled(True)
-        self.btn_slam.setText("Slam")
         self.btn_store_map.setVisible(True)
-        self.btn_store_map.setEnabled(False)
         self.btn_loc.setVisible(True)
-        self.btn_loc.setEnabled(True)
-        self.btn_loc.setText("Localization")
         self.btn_reset.setVisible(True)
         self.btn_reset.setText("Reset")
+        self.tools_widget.setVisible(True)
         self.current_ip_label.setText(f"Connected IP: {ip}")
         self.current_ip_label.setVisible(True)
+        self.script_status_label.setText("")
+        self.script_status_label.setVisible(True)
         self.lidar_combo.setVisible(True)
         self.lidar_label.setVisible(True)
         self.form_layout_widget.setVisible(True)
         self.btn_reset_joints.setVisible(True)
         self.btn_camera.setVisible(True)
-        self.btn_camera.setText("Open Camera")
-        self.camera_active = False
-        # YOLO 按鈕初始為隱藏，只有 camera 開啟時才顯示
-        self.btn_yolo.setVisible(False)
-        self.btn_yolo.setText("Open YOLO")
-        self.btn_yolo.setEnabled(False)
-        self.yolo_active = False
+        # 實際狀態等 /events 的 snapshot 進來再更新
+        self.script_states = {}
+        self._refresh_script_buttons()
 
     def _set_disconnected(self):
         self.connected = False
+        self._script_generation += 1
         self.slam_active = False
         self.loc_active = False
+        self.events.stop()
 
         # 保存當前的IP和port以用於停止服務
         current_ip = self.current_ip
@@ -690,6 +1119,7 @@ class IPInputWindow(QWidget):
         self.ip_edit.setEnabled(True)
         self.port_edit.setEnabled(True)
         self.btn_connect.setText("Connect")
+        self._refresh_connect_best()
         self.btn_slam.setVisible(False)
         self.btn_slam.setText("Slam")
         self.btn_store_map.setVisible(False)
@@ -698,7 +1128,9 @@ class IPInputWindow(QWidget):
         self.btn_loc.setText("Localization")
         self.btn_reset.setVisible(False)
         self.btn_reset.setText("Reset")
+        self.tools_widget.setVisible(False)
         self.current_ip_label.setVisible(False)
+        self.script_status_label.setVisible(False)
         self.current_ip = ""
         self.btn_reset_joints.setVisible(False)
         self._disconnect_rosbridge()
@@ -706,38 +1138,183 @@ class IPInputWindow(QWidget):
         # 如果 YOLO 正在運行，先停止它
         if self.yolo_active and current_ip:
             self.yolo_active = False
-            threading.Thread(
-                target=self._send_yolo_stop, args=(current_ip, current_port)
-            ).start()
+            self.executor.submit(self._send_yolo_stop, current_ip, current_port)
 
         # 如果 Camera 正在運行，也要停止它
         if self.camera_active and current_ip:
             self.camera_active = False
-            threading.Thread(
-                target=self._send_camera_stop, args=(current_ip, current_port)
-            ).start()
+            self.executor.submit(self._send_camera_stop, current_ip, current_port)
 
         self.btn_camera.setVisible(False)
         self.camera_active = False
         self.btn_yolo.setVisible(False)  # 隱藏 YOLO 按鈕
         self.yolo_active = False
+        self.script_states = {}
+        self.pending_scripts.clear()
 
     @staticmethod
     def validate_ip(ip: str) -> bool:
-        parts = ip.split(".")
-        if len(parts) != 4:
-            return False
-        for p in parts:
-            if not p.isdigit():
-                return False
-            n = int(p)
-            if n < 0 or n > 255:
-                return False
-        return True
+        # IPv4、IPv6 與 hostname 都接受
+        return validate_host(ip)
+
+    # －－－－－－－－ Discovery －－－－－－－－#
+    def refresh_profile_combo(self):
+        self.profile_combo.clear()
+        if not self.profiles.profiles:
+            self.profile_combo.addItem("No recent robots")
+            self.profile_combo.setEnabled(False)
+            return
+        self.profile_combo.setEnabled(True)
+        for p in self.profiles.profiles:
+            latency = p.get("latency_ms")
+            text = f"{format_host(p['host'])}:{p['port']}"
+            if latency is not None:
+                text += f"  ({latency:.0f} ms)"
+            if p.get("rosbridge") is False:
+                text += "  [no rosbridge]"
+            self.profile_combo.addItem(text, (p["host"], p["port"]))
+
+    def on_profile_selected(self, index):
+        data = self.profile_combo.itemData(index)
+        if not data or self.connected:
+            return
+        host, port = data
+        self.ip_edit.setText(host)
+        self.port_edit.setText(str(port))
+
+    def on_scan_click(self):
+        port_text = self.port_edit.text().strip()
+        try:
+            port = int(port_text) if port_text else 5000
+        except ValueError:
+            QMessageBox.warning(self, "Warning", "Invalid port format.")
+            return
+        spec = "" if self.connected else self.ip_edit.text().strip()
+
+        self.btn_scan.setEnabled(False)
+        self.btn_scan.setText("Scanning...")
+        self.executor.submit(self._scan_worker, spec, port, self.rosbridge_port)
+
+    def _scan_worker(self, spec: str, port: int, rosbridge_port: int):
+        try:
+            results = scan_sync(spec, port, rosbridge_port=rosbridge_port)
+            self.scan_finished.emit(results, "")
+        except Exception as e:
+            self.scan_finished.emit([], str(e))
+
+    def on_scan_finished(self, results, error):
+        self.btn_scan.setEnabled(True)
+        self.btn_scan.setText("Scan")
+        if error:
+            QMessageBox.warning(self, "Warning", f"Scan failed: {error}")
+            return
+
+        self.scan_results = results
+        self.profiles.record_scan(results)
+        self.refresh_profile_combo()
+        self._refresh_connect_best()
+        if not results:
+            QMessageBox.information(self, "Info", "No robots found.")
+
+    def _best_candidate(self):
+        """
+        回傳 (host, port, latency_ms, from_scan)，只考慮兩個 port 都有開的機器人。
+        本次掃描結果優先，沒有時改用已存的 profile。
+        """
+        for r in self.scan_results:
+            if r.rosbridge_ok:
+                return r.host, r.port, r.latency_ms, True
+        best = self.profiles.best()
+        if best is not None:
+            return best["host"], best["port"], best.get("latency_ms"), False
+        return None
+
+    def _refresh_connect_best(self):
+        best = self._best_candidate()
+        self.btn_connect_best.setEnabled(best is not None and not self.connected)
+        if best is None:
+            self.btn_connect_best.setText("Connect Best")
+            return
+        host, _, latency_ms, from_scan = best
+        details = [format_host(host)]
+        if latency_ms is not None:
+            details.append(f"{latency_ms:.0f} ms")
+        if not from_scan:
+            details.append("saved")
+        self.btn_connect_best.setText(f"Connect Best ({', '.join(details)})")
+
+    def on_connect_best_click(self):
+        best = None if self.connected else self._best_candidate()
+        if best is None:
+            return
+        host, port, _, from_scan = best
+        if from_scan:
+            self._connect_to(host, port)
+            return
+        # 已存的 profile 可能早就離線，先快速確認兩個 port 還有開
+        self.btn_connect_best.setEnabled(False)
+        self.btn_connect_best.setText("Checking...")
+        self.executor.submit(self._check_best_worker, host, port, self.rosbridge_port)
+
+    def _check_best_worker(self, host: str, port: int, rosbridge_port: int):
+        try:
+            results = scan_sync(host, port, rosbridge_port=rosbridge_port)
+            self.best_checked.emit(results[0] if results else None, "")
+        except Exception as e:
+            self.best_checked.emit(None, str(e))
+
+    def on_best_checked(self, result, error):
+        if result is not None:
+            self.profiles.record(
+                result.host, result.port, result.latency_ms, result.rosbridge_ok
+            )
+            self.profiles.save()
+            self.refresh_profile_combo()
+        self._refresh_connect_best()
+        if self.connected:
+            return
+        if result is not None and result.rosbridge_ok:
+            self._connect_to(result.host, result.port)
+            return
+        QMessageBox.warning(
+            self,
+            "Warning",
+            f"Saved robot is not reachable: {error}"
+            if error
+            else "Saved robot is not reachable with both ports open. Try Scan.",
+        )
+
+    def _connect_to(self, host: str, port: int):
+        self.ip_edit.setText(host)
+        self.port_edit.setText(str(port))
+        self.on_connect_click()
+
+
+def start_simulator(app, window):
+    """--sim：在背景啟動模擬機器人，並把 IP / port 指向它"""
+    from sim_robot import SimRobot
+
+    try:
+        sim = SimRobot()
+    except OSError:
+        sim = SimRobot(web_port=0, rosbridge_port=0)  # 5000 / 9090 已被佔用
+    sim.start()
+    app.aboutToQuit.connect(sim.stop)
+    window.rosbridge_port = sim.rosbridge_port
+    window.ip_edit.setText("127.0.0.1")
+    window.port_edit.setText(str(sim.web_port))
+    window.setWindowTitle(f"{window.windowTitle()} (Simulated Robot)")
+    print(
+        f"[INFO] Simulated robot on 127.0.0.1: web port {sim.web_port}, "
+        f"rosbridge port {sim.rosbridge_port}"
+    )
+    return sim
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = IPInputWindow()
+    if "--sim" in sys.argv[1:]:
+        sim = start_simulator(app, window)
     window.show()
     sys.exit(app.exec_())
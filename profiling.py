@@ -0,0 +1,381 @@
+import collections
+import gc
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_ENV = "PROS_PROFILE"  # 設為 1 時啟動就開始 profiling
+# 沒有 /proc 可讀 thread CPU 時間時的退路：停在這些函式的 thread 視為閒置
+_IDLE_FUNCS = {
+    "wait",
+    "select",
+    "poll",
+    "sleep",
+    "readinto",
+    "_wait_for_tstate_lock",
+    "_worker",  # ThreadPoolExecutor 閒置時停在 queue.get
+    "exec_",
+    "doPoll",  # twisted reactor
+    "doSelect",
+}
+
+
+def profiling_requested() -> bool:
+    return os.environ.get(PROFILE_ENV) == "1"
+
+
+def _count_sockets():
+    # Linux 直接數 /proc/self/fd，其他平台退而求其次數 socket 物件
+    fd_dir = "/proc/self/fd"
+    if os.path.isdir(fd_dir):
+        count = 0
+        for fd in os.listdir(fd_dir):
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith("socket:"):
+                    count += 1
+            except OSError:
+                pass
+        return count
+    return sum(
+        1
+        for o in gc.get_objects()
+        if isinstance(o, socket.socket) and o.fileno() != -1
+    )
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _read_task(fds: dict, native_id, name: str):
+    """
+    讀 /proc/self/task/<tid>/<name>，讀不到時回傳 None。
+    fd 留在 fds 裡重複用 pread，取樣 thread 不必每次 open / close
+    """
+    if native_id is None:
+        return None
+    key = (native_id, name)
+    fd = fds.get(key)
+    try:
+        if fd is None:
+            fd = fds[key] = os.open(
+                f"/proc/self/task/{native_id}/{name}", os.O_RDONLY
+            )
+        return os.pread(fd, 128, 0)
+    except OSError:
+        if fds.pop(key, None) is not None:
+            os.close(fd)  # thread 已結束
+        return None
+
+
+def _close_tasks(fds: dict, alive=()):
+    """關掉已結束 thread 的 fd；alive 為空時全部關掉"""
+    for key in [k for k in fds if k[0] not in alive]:
+        os.close(fds.pop(key))
+
+
+def _thread_cpu_ns(fds: dict, native_id):
+    """thread 累計的 CPU 時間（ns），讀不到時回傳 None"""
+    # schedstat 第一欄是 on-CPU 時間（ns），比 stat 的 clock tick 精細
+    data = _read_task(fds, native_id, "schedstat")
+    try:
+        return int(data.split(None, 1)[0])
+    except (AttributeError, ValueError, IndexError):
+        return None
+
+
+def _thread_blocked(fds: dict, native_id) -> bool:
+    """
+    thread 此刻是否卡在 sleep / epoll / select 這類等待中（讀 wchan）。
+    futex 不算：等 GIL 的忙碌 thread 也停在 futex，交給 _IDLE_FUNCS 判斷。
+    """
+    wchan = (_read_task(fds, native_id, "wchan") or b"").strip()
+    return wchan not in (b"", b"0") and not wchan.startswith(b"futex")
+
+
+def _qt_app():
+    """目前 thread 是 GUI thread 時回傳 QApplication，否則 None"""
+    try:
+        from PyQt5.QtCore import QThread
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    app = QApplication.instance()
+    if app is None or QThread.currentThread() is not app.thread():
+        return None
+    return app
+
+
+def _count_qt_objects():
+    """
+    回傳 (widget 數, QObject 數)，Qt widget API 不是 thread-safe，
+    只在 GUI thread 計算；其他 thread 或沒有 QApplication 時為 (None, None)。
+    QObject 數只走 QApplication 與各 top-level widget 底下的 Qt 物件樹，
+    不掃 gc.get_objects()：後者每次都要看過所有 Python 物件，profiler 自己就成了熱點
+    """
+    app = _qt_app()
+    if app is None:
+        return None, None
+    from PyQt5.QtCore import QObject
+
+    widgets = len(app.allWidgets())
+    qobjects = 1 + len(app.findChildren(QObject))
+    for top in app.topLevelWidgets():
+        qobjects += 1 + len(top.findChildren(QObject))
+    return widgets, qobjects
+
+
+def _in_profiler(frame) -> bool:
+    """stack 上有本模組的 frame（Qt 計數、report 等 profiler 自己的工作）"""
+    while frame is not None:
+        if frame.f_code.co_filename == __file__:
+            return True
+        frame = frame.f_back
+    return False
+
+
+class ResourceProfiler:
+    """
+    opt-in 的資源 profiler：
+      - 定期記錄 CPU%、RSS、thread / socket / Qt 物件數、tracemalloc 用量
+      - 背景 thread 定期取樣各 thread 的 stack，依取樣間隔內實際用掉的
+        CPU 時間加權；取樣當下 thread 已回到等待（sleep、epoll、lock）時，
+        這段 CPU 時間發生在兩次取樣之間，另計為未歸屬，不算到等待的 frame
+      - profiler 自己的 thread 與工作（Qt 計數等）另計，不進 hot frames
+      - Qt 物件數由 GUI thread 的 QTimer 計算，背景 thread 只讀快取
+      - tracemalloc snapshot 與啟動時的 baseline 比較
+    """
+
+    def __init__(self, interval: float = 5.0, sample_hz: float = 100.0):
+        self.interval = interval
+        self.sample_period = 1.0 / sample_hz
+        self.samples = collections.deque(maxlen=10000)
+        self.hot_frames = collections.Counter()  # (code, line) -> CPU ns
+        self.cpu_samples = 0
+        self.cpu_sampled_ns = 0  # 取樣到的 CPU 時間總和（含未歸屬）
+        self.unattributed_ns = 0  # 取樣時 thread 已在等待，不知道花在哪
+        self.profiler_ns = 0  # profiler 自己用掉的 CPU 時間
+        self.wall_clock_sampling = False  # 讀不到 thread CPU 時間，退回 stack 取樣
+        self.running = False
+        self._baseline = None
+        self._owns_tracemalloc = False  # start() 才開的 tracemalloc，stop() 才關
+        self._qt_counts = (None, None)
+        self._qt_timer = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_wall = self._last_cpu = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stop.clear()
+        # 重新開始時清掉上一輪的資料，report 只比較這一輪
+        self.samples.clear()
+        self.hot_frames.clear()
+        self.cpu_samples = 0
+        self.cpu_sampled_ns = self.unattributed_ns = self.profiler_ns = 0
+        self.wall_clock_sampling = False
+        self._qt_counts = (None, None)
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(10)
+        self._start_qt_timer()
+        self._last_wall, self._last_cpu = time.monotonic(), time.process_time()
+        # 先 sample 一次再取 baseline，第一次走訪 Qt 物件樹時 PyQt 會一次性建立 wrapper
+        self.sample()
+        self._baseline = tracemalloc.take_snapshot()
+        self._threads = [
+            threading.Thread(
+                target=self._stats_loop, name="profiler-stats", daemon=True
+            ),
+            threading.Thread(
+                target=self._cpu_sampler, name="profiler-sampler", daemon=True
+            ),
+        ]
+        for t in self._threads:
+            t.start()
+        print("[INFO] Profiling started")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if self._qt_timer is not None:
+            self._qt_timer.stop()
+            self._qt_timer = None
+        self.sample()
+        self.running = False
+        print(f"[INFO] Profiling stopped\n{self.report()}")
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        self._baseline = None
+
+    def _start_qt_timer(self):
+        if _qt_app() is None:
+            return
+        from PyQt5.QtCore import QTimer
+
+        self._refresh_qt_counts()
+        self._qt_timer = QTimer()
+        self._qt_timer.timeout.connect(self._refresh_qt_counts)
+        self._qt_timer.start(int(self.interval * 1000))
+
+    def _refresh_qt_counts(self):
+        self._qt_counts = _count_qt_objects()
+
+    def sample(self):
+        """記錄一筆資源用量，可從任何 thread 呼叫"""
+        wall, cpu = time.monotonic(), time.process_time()
+        elapsed = wall - self._last_wall if self._last_wall is not None else 0
+        cpu_percent = (cpu - self._last_cpu) / elapsed * 100.0 if elapsed else 0.0
+        self._last_wall, self._last_cpu = wall, cpu
+
+        if _qt_app() is not None:
+            self._refresh_qt_counts()
+        widgets, qobjects = self._qt_counts
+        traced, _ = tracemalloc.get_traced_memory()
+        sample = {
+            "time": time.time(),
+            "cpu_percent": cpu_percent,
+            "rss": _rss_bytes(),
+            "threads": threading.active_count(),
+            "sockets": _count_sockets(),
+            "qt_widgets": widgets,
+            "qt_objects": qobjects,
+            "traced": traced,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def _stats_loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _cpu_sampler(self):
+        own = {t.ident for t in self._threads}
+        last_cpu = {}  # thread ident -> 上次讀到的 CPU ns
+        fds = {}  # (native_id, 檔名) -> /proc fd
+        alive = set()
+        self.wall_clock_sampling = not os.path.isdir("/proc/self/task")
+        while not self._stop.wait(self.sample_period):
+            native_ids = {t.ident: t.native_id for t in threading.enumerate()}
+            if alive != native_ids.keys():
+                alive = set(native_ids)
+                _close_tasks(fds, set(native_ids.values()))
+            cpu_now = {}
+            for ident, frame in sys._current_frames().items():
+                native_id = native_ids.get(ident)
+                if self.wall_clock_sampling:
+                    # 沒有 /proc：只能看 stack 頂端猜是否閒置，每次取樣算 1
+                    if ident in own or frame.f_code.co_name in _IDLE_FUNCS:
+                        continue
+                    if _in_profiler(frame):
+                        continue
+                    weight = 1
+                else:
+                    cpu = _thread_cpu_ns(fds, native_id)
+                    if cpu is None:
+                        continue
+                    cpu_now[ident] = cpu
+                    weight = cpu - last_cpu.get(ident, cpu)
+                    if weight <= 0:
+                        continue  # 這段時間沒用到 CPU
+                    if ident in own or _in_profiler(frame):
+                        self.profiler_ns += weight
+                        continue
+                    if frame.f_code.co_name in _IDLE_FUNCS or _thread_blocked(
+                        fds, native_id
+                    ):
+                        # 一陣工作後又回去等待：stack 只剩等待的 frame，不能算給它
+                        self.unattributed_ns += weight
+                        self.cpu_sampled_ns += weight
+                        continue
+                # 字串到 report 時才組，取樣時只用 (code, line) 當 key
+                self.hot_frames[frame.f_code, frame.f_lineno] += weight
+                self.cpu_sampled_ns += weight
+            last_cpu = cpu_now
+            self.cpu_samples += 1
+        _close_tasks(fds)
+
+    def memory_growth(self, limit: int = 10):
+        """與 baseline 比較，回傳成長最多的 tracemalloc 統計"""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        return snapshot.compare_to(self._baseline, "lineno")[:limit]
+
+    def report(self) -> str:
+        if not self.samples:
+            return "No profiling samples."
+        first, last = self.samples[0], self.samples[-1]
+        duration = last["time"] - first["time"]
+        lines = [f"Duration: {duration / 60:.1f} min, {len(self.samples)} samples"]
+        for key in (
+            "rss",
+            "traced",
+            "threads",
+            "sockets",
+            "qt_widgets",
+            "qt_objects",
+        ):
+            a, b = first[key], last[key]
+            if a is None or b is None:
+                continue
+            if key in ("rss", "traced"):
+                lines.append(
+                    f"{key}: {a / 1e6:.1f} MB -> {b / 1e6:.1f} MB "
+                    f"({(b - a) / 1e6:+.1f} MB)"
+                )
+            else:
+                lines.append(f"{key}: {a} -> {b} ({b - a:+d})")
+        cpu = [s["cpu_percent"] for s in list(self.samples)[1:]]
+        if cpu:
+            lines.append(f"cpu: avg {sum(cpu) / len(cpu):.1f}% max {max(cpu):.1f}%")
+
+        if self.cpu_sampled_ns:
+            if self.wall_clock_sampling:
+                lines.append(
+                    f"Busy frames, wall-clock (% of {self.cpu_sampled_ns} samples):"
+                )
+            else:
+                lines.append(
+                    f"Hot frames (% of {self.cpu_sampled_ns / 1e9:.2f} s "
+                    f"sampled CPU time, {self.cpu_samples} samples):"
+                )
+            for (code, line), n in self.hot_frames.most_common(10):
+                lines.append(
+                    f"  {n * 100.0 / self.cpu_sampled_ns:5.1f}%  "
+                    f"{os.path.basename(code.co_filename)}:{line} {code.co_name}"
+                )
+            if self.unattributed_ns:
+                lines.append(
+                    f"  {self.unattributed_ns * 100.0 / self.cpu_sampled_ns:5.1f}%  "
+                    "(between samples, thread already waiting again)"
+                )
+        if self.profiler_ns:
+            lines.append(
+                f"Profiler overhead (not included above): "
+                f"{self.profiler_ns / 1e9:.2f} s CPU"
+            )
+        growth = self.memory_growth()
+        if growth:
+            lines.append("Top memory growth since start:")
+            lines.extend(f"  {stat}" for stat in growth)
+        return "\n".join(lines)
@@ -0,0 +1,283 @@
+"""
+檔案格式（little endian）：
+
+    FILE_MAGIC
+    chunk*
+        CHUNK_HEADER: magic, record 數, 第一筆時間, 最後一筆時間, payload 長度
+        payload: record*
+            RECORD_HEADER: 時間, 方向, topic 長度, data 長度
+            topic (utf-8) + data (JSON, utf-8)
+
+旁邊的 <path>.idx 每個 chunk 一筆 INDEX_ENTRY（offset, 起訖時間, record 數），
+兩個檔案都只會 append。.idx 遺失或比資料檔舊時，reader 會掃 chunk header 重建。
+寫入失敗時兩個檔案都截回上一個完整 chunk 的結尾，截不回去就停止錄製。
+"""
+
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+FILE_MAGIC = b"PROSLOG1"
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sIddI")
+RECORD_HEADER = struct.Struct("<dBHI")
+INDEX_ENTRY = struct.Struct("<QddI")
+
+INCOMING = 0
+OUTGOING = 1
+
+
+class TopicRecorder:
+    """
+    record() 只把 (時間, topic, message) 放進 deque，不做序列化，
+    GUI / teleop thread 幾乎沒有額外負擔；JSON 編碼與寫檔都在背景 thread。
+    磁碟跟不上時 queue 最多留 max_queue 筆，之後的訊息丟掉並計入 dropped。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunk_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+    ):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.records = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.error = None  # 無法復原的寫入錯誤，錄製已停止
+
+        self._queue = collections.deque()
+        self._stop = threading.Event()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file, self._index = self._open()
+        if new_file:
+            self._file.write(FILE_MAGIC)
+            self._file.flush()
+        self._offset = self._file.tell()
+        self._index_offset = self._index.tell()
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        # 大 buffer 的 append 寫入，一次寫一整個 chunk
+        data = open(self.path, "ab", buffering=self.chunk_bytes)
+        try:
+            return data, open(self.path + ".idx", "ab")
+        except OSError:
+            data.close()
+            raise
+
+    def record(self, topic: str, message, direction: int = INCOMING):
+        """可從任何 thread 呼叫"""
+        queue = self._queue
+        if len(queue) >= self.max_queue or self.error is not None:
+            self.dropped += 1
+            return
+        queue.append((time.time(), direction, topic, message))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        for f in (self._file, self._index):
+            try:
+                f.close()
+            except OSError:
+                pass  # 寫入錯誤已在 _write_chunk 回報
+    def _writer_loop(self):
+        payload = bytearray()
+        count = 0
+        first_t = last_t = 0.0
+        chunk_started = time.monotonic()
+        queue = self._queue
+
+        while True:
+            stopping = self._stop.wait(0.05)
+            while queue:
+                t, direction, topic, message = queue.popleft()
+                if not isinstance(message, dict):
+                    message = dict(message)  # roslibpy.Message 是 UserDict
+                try:
+                    data = json.dumps(message, separators=(",", ":")).encode()
+                except (TypeError, ValueError) as e:
+                    print(f"[WARN] Recorder skipped {topic}: {e}")
+                    continue
+                topic_bytes = topic.encode()
+                if count == 0:
+                    first_t = t
+                    chunk_started = time.monotonic()
+                last_t = t
+                payload += RECORD_HEADER.pack(
+                    t, direction, len(topic_bytes), len(data)
+                )
+                payload += topic_bytes
+                payload += data
+                count += 1
+                if len(payload) >= self.chunk_bytes:
+                    self._write_chunk(payload, count, first_t, last_t)
+                    payload.clear()
+                    count = 0
+                    if self.error is not None:
+                        break
+
+            if count and (
+                stopping or time.monotonic() - chunk_started >= self.flush_interval
+            ):
+                self._write_chunk(payload, count, first_t, last_t)
+                payload.clear()
+                count = 0
+            if self.error is not None:
+                self.dropped += len(queue)
+                queue.clear()
+                return
+            if stopping:
+                return
+
+    def _write_chunk(self, payload, count, first_t, last_t):
+        header = CHUNK_HEADER.pack(CHUNK_MAGIC, count, first_t, last_t, len(payload))
+        try:
+            self._file.write(header)
+            self._file.write(payload)
+            self._file.flush()
+            # 資料先落地再寫 index，避免 index 指到不完整的 chunk
+            self._index.write(INDEX_ENTRY.pack(self._offset, first_t, last_t, count))
+            self._index.flush()
+        except OSError as e:
+            print(f"[ERROR] Recorder write failed, dropped {count} messages: {e}")
+            self.dropped += count
+            self._rollback()
+            return
+        self._offset += len(header) + len(payload)
+        self._index_offset += INDEX_ENTRY.size
+        self.records += count
+        self.bytes_written += len(header) + len(payload)
+
+    def _rollback(self):
+        """
+        寫到一半失敗時，檔案尾端可能有半個 chunk 或半筆 index，之後的 offset 全會錯。
+        重新開檔（丟掉 buffer 裡沒寫出去的部分），再截回上一個完整 chunk 的結尾；
+        截不回去就停止錄製。
+        """
+        for f in (self._file, self._index):
+            try:
+                f.close()
+            except OSError:
+                pass  # close 時 flush 失敗，buffer 一樣會被丟掉
+        try:
+            self._file, self._index = self._open()
+            os.ftruncate(self._file.fileno(), self._offset)
+            os.ftruncate(self._index.fileno(), self._index_offset)
+        except OSError as e:
+            self.error = str(e)
+            print(f"[ERROR] Recorder stopped, {self.path} kept up to the last chunk: {e}")
+
+
+class TopicLogReader:
+    """
+    以 mmap 開啟錄製檔，只解析查詢時間範圍內的 chunk。
+
+    for t, direction, topic, message in reader.read(start, end, topics=...):
+        ...
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if size
+            else b""
+        )
+        if self._mm[: len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"Not a recorder file: {path}")
+        # list[(offset, start_t, end_t, count)]，依 offset 排序
+        self.chunks = self._load_index()
+        self._ends = [c[2] for c in self.chunks]
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def start_time(self):
+        return self.chunks[0][1] if self.chunks else None
+
+    @property
+    def end_time(self):
+        return self.chunks[-1][2] if self.chunks else None
+
+    def _load_index(self):
+        chunks = []
+        idx_path = self.path + ".idx"
+        if os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % INDEX_ENTRY.size
+            chunks = [e for e in INDEX_ENTRY.iter_unpack(raw[:usable])]
+        # 只相信從檔頭開始連續、且指向完整 chunk 的 index，剩下的從資料檔補
+        valid = []
+        offset = len(FILE_MAGIC)
+        for entry in chunks:
+            header = self._chunk_at(entry[0])
+            if entry[0] != offset or header is None:
+                break
+            valid.append(entry)
+            offset += CHUNK_HEADER.size + header[4]
+        return valid + self._scan_chunks(offset)
+
+    def _chunk_at(self, offset):
+        end = offset + CHUNK_HEADER.size
+        if end > len(self._mm):
+            return None
+        header = CHUNK_HEADER.unpack_from(self._mm, offset)
+        if header[0] != CHUNK_MAGIC or end + header[4] > len(self._mm):
+            return None
+        return header
+
+    def _scan_chunks(self, offset):
+        chunks = []
+        while True:
+            header = self._chunk_at(offset)
+            if header is None:
+                return chunks
+            _, count, first_t, last_t, length = header
+            chunks.append((offset, first_t, last_t, count))
+            offset += CHUNK_HEADER.size + length
+
+    def read(self, start=None, end=None, topics=None):
+        """lazy 產生 (t, direction, topic, message)，start / end 為 epoch 秒"""
+        topics = set(topics) if topics else None
+        first = 0 if start is None else bisect.bisect_left(self._ends, start)
+        mm = self._mm
+        for offset, first_t, _, _ in self.chunks[first:]:
+            if end is not None and first_t > end:
+                return
+            _, count, _, _, length = CHUNK_HEADER.unpack_from(mm, offset)
+            pos = offset + CHUNK_HEADER.size
+            for _ in range(count):
+                t, direction, topic_len, data_len = RECORD_HEADER.unpack_from(mm, pos)
+                pos += RECORD_HEADER.size
+                topic_end = pos + topic_len
+                data_end = topic_end + data_len
+                if (start is None or t >= start) and (end is None or t <= end):
+                    topic = mm[pos:topic_end].decode()
+                    if topics is None or topic in topics:
+                        yield t, direction, topic, json.loads(mm[topic_end:data_end])
+                pos = data_end
@@ -0,0 +1,150 @@
+"""
+與 server 之間常駐的 SSE 連線（GET /events），接收 script 生命週期事件：
+
+    {"type": "snapshot", "scripts": {"star_car": "running", ...}}  連上時送一次
+    {"type": "state", "script": "slam_ydlidar", "state": "running"}
+    {"type": "log", "script": "slam_ydlidar", "line": "..."}
+
+state 為 starting / running / stopped / exited / failed，failed 與 exited 可帶 "code"。
+"""
+
+import http.client
+import json
+import socket
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+EVENTS_PATH = "/events"
+ACTIVE_STATES = ("starting", "running")
+CONNECT_TIMEOUT = 3.0  # 連不上的 host 不要卡到 read_timeout 那麼久
+
+
+class _Run:
+    """一次 start() 的連線狀態；stop() 後舊 thread 只會動到自己的這份"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.stop = threading.Event()
+        self.conn = None
+        self.sock = None
+
+
+class ScriptEventChannel(QObject):
+    # 由背景 thread emit，Qt 會排進 GUI thread 執行 slot
+    event_received = pyqtSignal(dict)
+    connection_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None, read_timeout: float = 30.0):
+        super().__init__(parent)
+        self.read_timeout = read_timeout
+        self.connected = False
+        self.supported = True  # server 回 404 時設為 False，改用 HTTP 回應判斷
+        self._run = None  # 目前的 _Run
+        self._thread = None
+
+    def start(self, host: str, port: int):
+        self.stop()
+        self.supported = True
+        self._run = _Run(host, port)
+        self._thread = threading.Thread(
+            target=self._loop, args=(self._run,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        run, self._run = self._run, None
+        if run is not None:
+            run.stop.set()
+            sock = run.sock
+            if sock is not None:
+                try:
+                    # 讓卡在 readline 的 thread 立刻醒來
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self._thread is not None:
+            # 還在 connect 的 thread 最多再跑 CONNECT_TIMEOUT，之後自行結束
+            self._thread.join(timeout=0.5)
+            self._thread = None
+        self._set_connected(None, False)
+
+    def _set_connected(self, run, connected: bool):
+        # run 為 None 表示由 GUI thread 呼叫；舊的 run 不能再改狀態
+        if run is not None and run is not self._run:
+            return
+        if connected != self.connected:
+            self.connected = connected
+            self.connection_changed.emit(connected)
+
+    def _loop(self, run: _Run):
+        backoff = 1.0
+        while not run.stop.is_set():
+            try:
+                self._listen(run)
+                backoff = 1.0
+            except (OSError, http.client.HTTPException) as e:
+                if not run.stop.is_set():
+                    print(f"[WARN] Script event channel error: {e}")
+            finally:
+                self._set_connected(run, False)
+                if run.conn is not None:
+                    run.conn.close()
+                    run.conn = None
+                run.sock = None
+            if run.stop.is_set():
+                return
+            if not self.supported:
+                print("[INFO] Server has no /events, using HTTP replies only")
+                return
+            # 斷線後重連，間隔逐步拉長到 10 秒
+            run.stop.wait(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    def _listen(self, run: _Run):
+        run.conn = http.client.HTTPConnection(
+            run.host.strip("[]"), run.port, timeout=CONNECT_TIMEOUT
+        )
+        run.conn.connect()
+        # getresponse 之後 conn.sock 會被清掉（response 接手），先留一份給 stop()
+        run.sock = run.conn.sock
+        run.sock.settimeout(self.read_timeout)
+        if run.stop.is_set():
+            return
+        run.conn.request(
+            "GET", EVENTS_PATH, headers={"Accept": "text/event-stream"}
+        )
+        resp = run.conn.getresponse()
+        if resp.status == 404:
+            if run is self._run:
+                self.supported = False
+            return
+        if resp.status != 200:
+            raise http.client.HTTPException(f"/events returned {resp.status}")
+        self._set_connected(run, True)
+
+        data = []
+        while not run.stop.is_set():
+            line = resp.readline()
+            if not line:
+                return  # server 關閉連線
+            line = line.decode("utf-8", "replace").rstrip("\r\n")
+            if line.startswith("data:"):
+                data.append(line[5:].lstrip())
+            elif not line and data:
+                # 空行代表一個 event 結束
+                self._dispatch(run, "\n".join(data))
+                data = []
+            # ":" 開頭的 keepalive 註解與其他欄位直接忽略
+
+    def _dispatch(self, run: _Run, payload: str):
+        if run is not self._run:
+            return  # 已 stop() 或改連別台
+        try:
+            event = json.loads(payload)
+        except ValueError as e:
+            print(f"[WARN] Bad script event: {e}")
+            return
+        if isinstance(event, dict):
+            self.event_received.emit(event)
@@ -0,0 +1,530 @@
+"""
+離線測試用的模擬機器人：
+
+  - pros_web_server：StandInServer 加上各 script 的啟動 / 停止延遲
+  - rosbridge：標準函式庫實作的 WebSocket server，支援 advertise / publish /
+    subscribe，roslibpy 可以直接連
+  - 運動學模擬：吃 /car_C_rear_wheel 與 /robot_arm，回送 /odom 與 /joint_states，
+    並回應 /latency_probe
+
+用法：
+    python sim_robot.py [web_port] [rosbridge_port]   # 預設 5000 / 9090
+    python main.py --sim                              # GUI 內建模擬模式
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import yaml
+
+from latency import ECHO_TOPIC, PROBE_TOPIC, echo_probe
+from standin_server import StandInServer
+
+LIDARS = ("ydlidar", "oradarlidar")
+SIM_SCRIPTS = (
+    ["star_car", "camera", "yolo", "store_map"]
+    + [f"slam_{lidar}" for lidar in LIDARS]
+    + [f"localization_{lidar}" for lidar in LIDARS]
+)
+# 啟動 / 停止大約要幾秒，接近實機 docker compose 的時間
+SIM_DELAYS = {
+    "star_car": 1.5,
+    "slam": 3.0,
+    "localization": 3.0,
+    "camera": 2.0,
+    "yolo": 4.0,
+    "store_map": 1.0,
+    "stop": 1.0,
+}
+
+WHEEL_TOPIC = "/car_C_rear_wheel"
+ARM_TOPIC = "/robot_arm"
+ODOM_TOPIC = "/odom"
+JOINT_STATES_TOPIC = "/joint_states"
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_CONT, _OP_TEXT, _OP_BINARY = 0x0, 0x1, 0x2
+_OP_CLOSE, _OP_PING, _OP_PONG = 0x8, 0x9, 0xA
+
+
+class RosbridgeServer:
+    """
+    最小的 rosbridge v2 server。client 之間的 publish 會互相轉送，
+    也可以用 add_handler() 在 server 端處理某個 topic。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9090):
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._handlers = {}  # topic -> [callback(msg)]
+        self.messages = 0
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                client = _WebSocketClient(server, self.connection, self.rfile)
+                if client.handshake():
+                    client.serve()
+
+        self.tcp = socketserver.ThreadingTCPServer((host, port), Handler, False)
+        self.tcp.daemon_threads = True
+        self.tcp.allow_reuse_address = True
+        self.tcp.server_bind()
+        self.tcp.server_activate()
+        self.port = self.tcp.server_address[1]  # port=0 時由 OS 指定
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.tcp.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.tcp.shutdown()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.close()
+        self.tcp.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def add_handler(self, topic: str, callback):
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(callback)
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return any(topic in c.subscriptions for c in self._clients)
+
+    def publish(self, topic: str, msg: dict, sender=None):
+        """送給所有訂閱 topic 的 client（不含 sender），再交給 server 端 handler"""
+        with self._lock:
+            self.messages += 1
+            clients = [
+                c for c in self._clients if c is not sender and topic in c.subscriptions
+            ]
+            handlers = list(self._handlers.get(topic, ()))
+        if clients:
+            payload = json.dumps({"op": "publish", "topic": topic, "msg": msg})
+            for client in clients:
+                client.send_text(payload)
+        for callback in handlers:
+            try:
+                callback(msg)
+            except Exception as e:
+                print(f"[WARN] Sim handler for {topic} failed: {e}")
+
+    def _add_client(self, client):
+        with self._lock:
+            self._clients.add(client)
+
+    def _remove_client(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+
+class _WebSocketClient:
+    """RFC 6455 server 端：只處理 rosbridge 會用到的 text frame"""
+
+    def __init__(self, server: RosbridgeServer, sock, rfile):
+        self.server = server
+        self.sock = sock
+        self.rfile = rfile
+        self.subscriptions = set()
+        self._send_lock = threading.Lock()
+        self._closed = False
+
+    def handshake(self) -> bool:
+        headers = {}
+        request = self.rfile.readline()
+        while True:
+            line = self.rfile.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not request.startswith(b"GET ") or not key:
+            self.sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WS_GUID).encode()).digest()
+        ).decode()
+        self.sock.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode()
+        )
+        return True
+
+    def serve(self):
+        self.server._add_client(self)
+        try:
+            while True:
+                message = self._read_message()
+                if message is None:
+                    return
+                self._on_message(message)
+        except (OSError, ValueError, struct.error):
+            pass  # client 斷線或送來壞掉的 frame
+        finally:
+            self.server._remove_client(self)
+            self.close()
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self.rfile.read(n)
+        if len(data) != n:
+            raise OSError("connection closed")
+        return data
+
+    def _read_message(self):
+        """回傳完整的 text / binary 訊息，對方關閉時回傳 None"""
+        parts = []
+        while True:
+            b0, b1 = self._read_exact(2)
+            fin, opcode = b0 & 0x80, b0 & 0x0F
+            length = b1 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", self._read_exact(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", self._read_exact(8))
+            mask = self._read_exact(4) if b1 & 0x80 else None
+            payload = self._read_exact(length)
+            if mask:
+                # 整段一次 XOR，比逐 byte 快很多
+                key = (mask * (length // 4 + 1))[:length]
+                payload = (
+                    int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+                ).to_bytes(length, "big")
+
+            if opcode == _OP_CLOSE:
+                self._send_frame(_OP_CLOSE, payload[:2])
+                return None
+            if opcode == _OP_PING:
+                self._send_frame(_OP_PONG, payload)
+                continue
+            if opcode == _OP_PONG:
+                continue
+            if opcode in (_OP_TEXT, _OP_BINARY, _OP_CONT):
+                parts.append(payload)
+                if fin:
+                    return b"".join(parts)
+
+    def _on_message(self, raw: bytes):
+        message = json.loads(raw.decode("utf-8"))
+        op = message.get("op")
+        topic = message.get("topic")
+        if op == "publish":
+            self.server.publish(topic, message.get("msg") or {}, sender=self)
+        elif op == "subscribe":
+            self.subscriptions.add(topic)
+        elif op == "unsubscribe":
+            self.subscriptions.discard(topic)
+        elif op == "call_service":
+            self.send_text(
+                json.dumps(
+                    {
+                        "op": "service_response",
+                        "id": message.get("id"),
+                        "service": message.get("service"),
+                        "values": {"message": "not supported by the simulator"},
+                        "result": False,
+                    }
+                )
+            )
+        # advertise / unadvertise 等其他 op 不需要處理
+
+    def send_text(self, text: str):
+        try:
+            self._send_frame(_OP_TEXT, text.encode("utf-8"))
+        except OSError:
+            self.close()
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            if self._closed:
+                return
+            self.sock.sendall(header + payload)
+
+    def close(self):
+        with self._send_lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self.sock.shutdown(2)
+        except OSError:
+            pass
+
+
+def _stamp(t: float) -> dict:
+    secs = int(t)
+    return {"secs": secs, "nsecs": int((t - secs) * 1e9)}
+
+
+class KinematicSim:
+    """
+    差速車 + 手臂的簡單運動學模擬。
+    輪速順序與 keyboard.yaml 相同：[左前, 右前, 左後, 右後]，單位視為 rad/s。
+    手臂指令與 main.py 送出的一樣是各關節角度（弧度），以 joint_speed 弧度/秒移向目標。
+    """
+
+    def __init__(
+        self,
+        bus: RosbridgeServer,
+        joint_defaults: dict = None,
+        rate: float = 20.0,
+        wheel_radius: float = 0.04,
+        track_width: float = 0.2,
+        cmd_timeout: float = 0.5,
+        joint_speed: float = math.radians(90.0),
+        enabled=None,
+    ):
+        """
+        joint_defaults: 關節名稱 -> 初始角度（度，同 keyboard.yaml）
+        enabled: 回傳 bool 的 callable，False 時忽略輪速指令（例如 star_car 未啟動）
+        """
+        self.bus = bus
+        self.period = 1.0 / rate
+        self.wheel_radius = wheel_radius
+        self.track_width = track_width
+        self.cmd_timeout = cmd_timeout
+        self.joint_speed = joint_speed
+        self.enabled = enabled or (lambda: True)
+
+        self.x = self.y = self.yaw = 0.0
+        self.linear = self.angular = 0.0
+        self.wheel_commands = self.arm_commands = 0
+        self._wheels = [0.0, 0.0, 0.0, 0.0]
+        self._last_cmd = 0.0
+        defaults = joint_defaults or {}
+        self.joint_names = list(defaults) or [f"joint_{i}" for i in range(1, 6)]
+        # yaml 的預設值是度，只在這裡換算一次，內部一律用弧度
+        self.joints = [math.radians(defaults.get(n, 0)) for n in self.joint_names]
+        self._joint_targets = list(self.joints)
+        self._joint_velocities = [0.0] * len(self.joints)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        bus.add_handler(WHEEL_TOPIC, self._on_wheel)
+        bus.add_handler(ARM_TOPIC, self._on_arm)
+        bus.add_handler(PROBE_TOPIC, self._on_probe)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _on_wheel(self, msg: dict):
+        data = [float(v) for v in msg.get("data") or []][:4]
+        with self._lock:
+            self.wheel_commands += 1
+            if not self.enabled():
+                return
+            self._wheels = data + [0.0] * (4 - len(data))
+            self._last_cmd = time.monotonic()
+
+    def _on_arm(self, msg: dict):
+        positions = [float(v) for v in msg.get("positions") or []]
+        with self._lock:
+            self.arm_commands += 1
+            for i, value in enumerate(positions[: len(self.joint_names)]):
+                self._joint_targets[i] = value
+
+    def _on_probe(self, msg: dict):
+        # 同一台機器，clock offset 為 0
+        echo = echo_probe(msg)
+        if echo is not None:
+            self.bus.publish(ECHO_TOPIC, echo)
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.wait(self.period):
+            now = time.monotonic()
+            self.step(now - last, now)
+            last = now
+            self._publish_state()
+
+    def step(self, dt: float, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_cmd > self.cmd_timeout:
+                # 跟實機一樣，太久沒收到指令就停車
+                self._wheels = [0.0, 0.0, 0.0, 0.0]
+            lf, rf, lr, rr = self._wheels
+            v_left = (lf + lr) / 2.0 * self.wheel_radius
+            v_right = (rf + rr) / 2.0 * self.wheel_radius
+            self.linear = (v_left + v_right) / 2.0
+            self.angular = (v_right - v_left) / self.track_width
+            # 以中點的 yaw 積分，轉彎時誤差較小
+            mid_yaw = self.yaw + self.angular * dt / 2.0
+            self.x += self.linear * math.cos(mid_yaw) * dt
+            self.y += self.linear * math.sin(mid_yaw) * dt
+            self.yaw = math.atan2(
+                math.sin(self.yaw + self.angular * dt),
+                math.cos(self.yaw + self.angular * dt),
+            )
+
+            max_step = self.joint_speed * dt
+            for i, target in enumerate(self._joint_targets):
+                delta = max(-max_step, min(max_step, target - self.joints[i]))
+                self.joints[i] += delta
+                self._joint_velocities[i] = delta / dt if dt else 0.0
+
+    def _publish_state(self):
+        t = time.time()
+        if self.bus.has_subscribers(ODOM_TOPIC):
+            self.bus.publish(ODOM_TOPIC, self.odometry(t))
+        if self.bus.has_subscribers(JOINT_STATES_TOPIC):
+            self.bus.publish(JOINT_STATES_TOPIC, self.joint_state(t))
+
+    def odometry(self, t: float = None) -> dict:
+        """nav_msgs/Odometry"""
+        t = time.time() if t is None else t
+        with self._lock:
+            x, y, yaw = self.x, self.y, self.yaw
+            linear, angular = self.linear, self.angular
+        return {
+            "header": {"stamp": _stamp(t), "frame_id": "odom"},
+            "child_frame_id": "base_link",
+            "pose": {
+                "pose": {
+                    "position": {"x": x, "y": y, "z": 0.0},
+                    "orientation": {
+                        "x": 0.0,
+                        "y": 0.0,
+                        "z": math.sin(yaw / 2.0),
+                        "w": math.cos(yaw / 2.0),
+                    },
+                },
+                "covariance": [0.0] * 36,
+            },
+            "twist": {
+                "twist": {
+                    "linear": {"x": linear, "y": 0.0, "z": 0.0},
+                    "angular": {"x": 0.0, "y": 0.0, "z": angular},
+                },
+                "covariance": [0.0] * 36,
+            },
+        }
+
+    def joint_state(self, t: float = None) -> dict:
+        """sensor_msgs/JointState，position 為弧度"""
+        t = time.time() if t is None else t
+        with self._lock:
+            positions = list(self.joints)
+            velocities = list(self._joint_velocities)
+        return {
+            "header": {"stamp": _stamp(t), "frame_id": ""},
+            "name": list(self.joint_names),
+            "position": positions,
+            "velocity": velocities,
+            "effort": [],
+        }
+
+
+def load_joint_defaults(path: str) -> dict:
+    """從 keyboard.yaml 的 arm_joint_limits 取各關節初始角度（度）"""
+    try:
+        with open(path, "r") as f:
+            limits = (yaml.safe_load(f) or {}).get("arm_joint_limits") or {}
+    except OSError:
+        return {}
+    return {
+        name: item.get("default", (item["min"] + item["max"]) / 2)
+        for name, item in limits.items()
+    }
+
+
+class SimRobot:
+    """pros_web_server + rosbridge + 運動學模擬，整組在背景 thread 執行"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        web_port: int = 5000,
+        rosbridge_port: int = 9090,
+        delays: dict = None,
+    ):
+        self.web = StandInServer(
+            host,
+            web_port,
+            delays=SIM_DELAYS if delays is None else delays,
+            scripts=SIM_SCRIPTS,
+        )
+        try:
+            self.bus = RosbridgeServer(host, rosbridge_port)
+        except OSError:
+            self.web.httpd.server_close()  # 不要佔住 web port
+            raise
+        yaml_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "keyboard.yaml"
+        )
+        self.sim = KinematicSim(
+            self.bus,
+            joint_defaults=load_joint_defaults(yaml_path),
+            enabled=lambda: "star_car" in self.web.running,
+        )
+
+    @property
+    def web_port(self) -> int:
+        return self.web.port
+
+    @property
+    def rosbridge_port(self) -> int:
+        return self.bus.port
+
+    def start(self):
+        self.web.start()
+        self.bus.start()
+        self.sim.start()
+        return self
+
+    def stop(self):
+        self.sim.stop()
+        self.bus.stop()
+        self.web.stop()
+
+
+if __name__ == "__main__":
+    web_port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rosbridge_port = int(sys.argv[2]) if len(sys.argv) > 2 else 9090
+    robot = SimRobot("0.0.0.0", web_port, rosbridge_port).start()
+    print(
+        f"[INFO] Simulated robot: http://0.0.0.0:{robot.web_port}, "
+        f"ws://0.0.0.0:{robot.rosbridge_port}, Ctrl+C to stop"
+    )
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        robot.stop()
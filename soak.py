@@ -0,0 +1,259 @@
+"""
+長時間 soak test：對本機 stand-in server 反覆執行
+connect / disconnect、slam / localization、camera / YOLO，並回報資源成長。
+
+用法：
+    python soak.py --hours 8
+    python soak.py --cycles 200 --rosbridge-port 9090  # 本機有 rosbridge 時
+    python soak.py --sim --hours 1  # 模擬機器人：含啟動延遲、rosbridge 與開車
+"""
+
+import argparse
+import collections
+import math
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import roslibpy  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+import main  # noqa: E402
+from discovery import ProfileStore  # noqa: E402
+from sim_robot import JOINT_STATES_TOPIC, SimRobot  # noqa: E402
+from standin_server import StandInServer  # noqa: E402
+
+
+SKIPPED_ROSBRIDGE = "skipped in soak"
+
+
+class LogMessageBox:
+    """取代 QMessageBox，soak 時不跳出 modal dialog，只記錄訊息"""
+
+    counts = collections.Counter()
+
+    @classmethod
+    def _log(cls, level, title, text):
+        cls.counts[level] += 1
+        if level != "information" and SKIPPED_ROSBRIDGE not in text:
+            print(f"[SOAK] {level} - {title}: {text}")
+
+    @classmethod
+    def information(cls, parent, title, text, *args):
+        cls._log("information", title, text)
+
+    @classmethod
+    def warning(cls, parent, title, text, *args):
+        cls._log("warning", title, text)
+
+    @classmethod
+    def critical(cls, parent, title, text, *args):
+        cls._log("critical", title, text)
+
+
+def pump(app, seconds: float = 0.0):
+    deadline = time.monotonic() + seconds
+    while True:
+        app.processEvents()
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(0.01)
+
+
+def wait_for_running(app, window, server, expected, timeout: float = 5.0) -> bool:
+    """
+    start / stop 都是背景送出的，等 stand-in server 上的 script 變成 expected，
+    且 GUI 已收到所有回應與事件（沒有 pending 或 starting 的 script）
+    """
+
+    def settled():
+        return (
+            server.running == expected
+            and server.active == expected  # 延遲模式下 stop 也要等它真的停下
+            and not window.pending_scripts
+            and window._connecting is None
+            and "starting" not in window.script_states.values()
+        )
+
+    deadline = time.monotonic() + timeout
+    while not settled() and time.monotonic() < deadline:
+        pump(app, 0.02)
+    return settled()
+
+
+def drive(app, window, robot, seconds: float = 0.5) -> bool:
+    """
+    等 ROSBridge 連上後按住 w + a 開一小段，確認模擬機器人有收到輪速；
+    再動一下手臂，確認 /joint_states 回報的角度（弧度）跟 slider 一致
+    """
+    # 開 profiling 時第一次連線要載入 twisted，在 tracemalloc 下可能超過 10 秒
+    deadline = time.monotonic() + 30.0
+    while not window.teleop.running and time.monotonic() < deadline:
+        pump(app, 0.02)
+    before = robot.sim.wheel_commands
+    window.teleop.press("w")
+    window.teleop.press("a")
+    pump(app, seconds)
+    window.teleop.release_all()
+    pump(app, 0.1)
+    if robot.sim.wheel_commands <= before:
+        print("[SOAK] drive: no wheel commands reached the simulator")
+        return False
+    return move_arm(app, window)
+
+
+def move_arm(app, window, timeout: float = 5.0) -> bool:
+    """把第一個關節推到另一端，等 /joint_states 追上"""
+    name = sorted(window.joint_sliders)[0]
+    slider = window.joint_sliders[name]
+    target = slider.minimum() if slider.value() != slider.minimum() else slider.maximum()
+
+    latest = {}
+    states = roslibpy.Topic(window.ros, JOINT_STATES_TOPIC, "sensor_msgs/JointState")
+    states.subscribe(latest.update)
+    try:
+        slider.setValue(target)  # 觸發 send_joint_command
+        expected = math.radians(target)
+
+        def reached():
+            names = latest.get("name") or []
+            if name not in names:
+                return False
+            return abs(latest["position"][names.index(name)] - expected) < 0.01
+
+        deadline = time.monotonic() + timeout
+        while not reached() and time.monotonic() < deadline:
+            pump(app, 0.02)
+        if not reached():
+            print(
+                f"[SOAK] arm: {JOINT_STATES_TOPIC} {name} did not reach "
+                f"{expected:.3f} rad, last={latest.get('position')}"
+            )
+            return False
+        return True
+    finally:
+        states.unsubscribe()
+
+
+def run_cycle(app, window, server, robot=None, timeout: float = 5.0) -> bool:
+    lidar = window.selected_lidar
+    window.ip_edit.setText("127.0.0.1")
+    window.port_edit.setText(str(server.port))
+
+    base = {"star_car"}
+    steps = (
+        (window.on_connect_click, base),
+        (window.on_slam_click, base | {f"slam_{lidar}"}),
+        (window.on_slam_click, base),
+        (window.on_loc_click, base | {f"localization_{lidar}"}),
+        (window.on_loc_click, base),
+        (window.on_camera_click, base | {"camera"}),
+        (window.on_yolo_click, base | {"camera", "yolo"}),
+        (window.on_yolo_click, base | {"camera"}),
+        (window.on_camera_click, base),
+        (window.on_connect_click, set()),  # disconnect
+    )
+    for i, (click, expected) in enumerate(steps):
+        click()
+        pump(app)
+        ok = wait_for_running(app, window, server, expected, timeout)
+        if not ok:
+            print(f"[SOAK] {click.__name__}: expected {sorted(expected)}")
+        elif i == 0 and robot is not None:
+            ok = drive(app, window, robot)
+        if not ok:
+            if window.connected:
+                window.on_connect_click()
+            wait_for_running(app, window, server, set(), timeout)
+            return False
+    return True
+
+
+def main_soak():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=0, help="0 表示依 --hours")
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--rosbridge-port", type=int, default=None)
+    parser.add_argument(
+        "--sim", action="store_true", help="改用模擬機器人（含 rosbridge）"
+    )
+    parser.add_argument(
+        "--report-every", type=int, default=50, help="幾個 cycle 印一次資源用量"
+    )
+    args = parser.parse_args()
+
+    main.QMessageBox = LogMessageBox
+    robot = None
+    timeout = 5.0
+    if args.sim:
+        robot = SimRobot(web_port=0, rosbridge_port=0).start()
+        server = robot.web
+        timeout = 15.0  # 啟動延遲最長約 4 秒
+    else:
+        server = StandInServer(port=0).start()
+    app = QApplication(sys.argv)
+    window = main.IPInputWindow()
+    # 每個 cycle 都會記錄 127.0.0.1:<隨機 port>，不能寫進真的 robot_profiles.yaml
+    profiles_dir = tempfile.TemporaryDirectory(prefix="soak-")
+    window.profiles = ProfileStore(os.path.join(profiles_dir.name, "profiles.yaml"))
+    window.refresh_profile_combo()
+    if robot is not None:
+        window.rosbridge_port = robot.rosbridge_port
+        window.rosbridge_timeout = 2
+        window.rosbridge_retries = 1
+    elif args.rosbridge_port:
+        window.rosbridge_port = args.rosbridge_port
+        window.rosbridge_timeout = 2
+        window.rosbridge_retries = 1
+    else:
+        # 沒有 rosbridge 時跳過，只測 HTTP 與 GUI 狀態切換
+        window._connect_rosbridge = lambda *a, **k: (None, SKIPPED_ROSBRIDGE)
+
+    profiler = window.profiler
+    profiler.interval = 30.0
+    window.chk_profile.setChecked(True)
+
+    deadline = time.monotonic() + args.hours * 3600
+    cycle = failures = 0
+    print(f"[SOAK] stand-in server on port {server.port}")
+    try:
+        while (args.cycles and cycle < args.cycles) or (
+            not args.cycles and time.monotonic() < deadline
+        ):
+            cycle += 1
+            if not run_cycle(app, window, server, robot, timeout):
+                failures += 1
+                print(f"[SOAK] cycle {cycle} failed, running={sorted(server.running)}")
+            if cycle % args.report_every == 0:
+                s = profiler.sample()
+                print(
+                    f"[SOAK] cycle {cycle}: rss={(s['rss'] or 0) / 1e6:.1f} MB "
+                    f"traced={s['traced'] / 1e6:.1f} MB threads={s['threads']} "
+                    f"sockets={s['sockets']} qt_objects={s['qt_objects']}"
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(
+            f"[SOAK] {cycle} cycles, {failures} failed, "
+            f"{server.requests} requests, dialogs={dict(LogMessageBox.counts)}"
+        )
+        profiler.stop()
+        window.close()
+        if robot is not None:
+            print(
+                f"[SOAK] simulator: {robot.sim.wheel_commands} wheel commands, "
+                f"{robot.bus.messages} rosbridge messages"
+            )
+            robot.stop()
+        else:
+            server.stop()
+        profiles_dir.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_soak())
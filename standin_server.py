@@ -0,0 +1,239 @@
+"""
+本機測試用的 pros_web_server 替身，只實作 client 用到的
+/run-script/<name> 與 script 生命週期事件的 SSE 串流 /events。
+
+預設 start / stop 立即完成（soak test 用）；給 delays 時會先停在 starting，
+依各 script 的啟動時間才轉成 running，stop 也要等一段時間才真正停下。
+用法：python standin_server.py [port]
+"""
+
+import json
+import queue
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_SCRIPT_RE = re.compile(r"^/run-script/([A-Za-z0-9_]+)$")
+ONE_SHOT_SCRIPTS = {"store_map"}  # 執行完就結束，不會留在 running
+REQUIRES = {"yolo": "camera"}  # 啟動完成時必須已在 running 的 script
+STOP_DELAY = "stop"  # delays 中 stop 所需時間的 key
+KEEPALIVE_INTERVAL = 10.0
+
+
+class StandInServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 5000,
+        delays: dict = None,
+        scripts=None,
+    ):
+        """
+        delays: script 名稱或前綴（slam、localization）-> 啟動秒數，"stop" 為停止秒數
+        scripts: 允許的 script 名稱，None 表示全部接受
+        """
+        self.delays = delays or {}
+        self.scripts = set(scripts) if scripts is not None else None
+        self.states = {}  # script -> starting / running / stopping
+        self.requests = 0
+        self._timers = {}  # script -> 尚未觸發的 threading.Timer
+        self._lock = threading.Lock()
+        self._subscribers = []  # 每個 /events 連線一個 queue.Queue
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]  # port=0 時由 OS 指定
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self) -> set:
+        """目前在跑的 script"""
+        with self._lock:
+            return {n for n, state in self.states.items() if state == "running"}
+
+    @property
+    def active(self) -> set:
+        """還有 container 的 script，包含 starting 與 stopping"""
+        with self._lock:
+            return set(self.states)
+
+    def stop(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            for q in self._subscribers:
+                q.put(None)  # 結束 SSE 連線
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def run_script(self, name: str) -> dict:
+        with self._lock:
+            self.requests += 1
+            script = name[: -len("_stop")] if name.endswith("_stop") else name
+            if self.scripts is not None and script not in self.scripts:
+                return {"status": "error", "message": f"Unknown script '{name}'"}
+            if script != name:
+                if self.states.get(script) in ("starting", "running"):
+                    self._cancel(script)
+                    self.states[script] = "stopping"
+                    self._after(self.delays.get(STOP_DELAY, 0), self._stopped, script)
+                return {"status": "Script execution started", "message": ""}
+            if script in self.states:
+                return {
+                    "status": "error",
+                    "message": f"Containers for '{name}' already running",
+                }
+            self.states[name] = "starting"
+            self._publish_state(name, "starting")
+            self._after(self._start_delay(name), self._started, name)
+            return {"status": "Script execution started", "message": ""}
+
+    def _start_delay(self, name: str) -> float:
+        if name in self.delays:
+            return self.delays[name]
+        return self.delays.get(name.split("_")[0], 0)
+
+    def _after(self, delay: float, func, script: str):
+        # 呼叫端需持有 self._lock；沒有延遲時直接完成
+        if delay <= 0:
+            func(script)
+            return
+
+        def fire():
+            with self._lock:
+                if self._timers.get(script) is timer:
+                    del self._timers[script]
+                    func(script)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        self._timers[script] = timer
+        timer.start()
+
+    def _cancel(self, script: str):
+        timer = self._timers.pop(script, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _started(self, name: str):
+        required = REQUIRES.get(name)
+        if required and self.states.get(required) != "running":
+            del self.states[name]
+            self._log(name, f"{required} is not running")
+            self._publish_state(name, "failed", code=1)
+        elif name in ONE_SHOT_SCRIPTS:
+            del self.states[name]
+            self._log(name, f"{name} finished")
+            self._publish_state(name, "exited", code=0)
+        else:
+            self.states[name] = "running"
+            self._log(name, f"{name} started")
+            self._publish_state(name, "running")
+
+    def _stopped(self, script: str):
+        self.states.pop(script, None)
+        self._publish_state(script, "stopped")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "type": "snapshot",
+                "scripts": {
+                    name: "starting" if state == "starting" else "running"
+                    for name, state in sorted(self.states.items())
+                },
+            }
+
+    def subscribe(self):
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def _log(self, script: str, line: str):
+        self._publish({"type": "log", "script": script, "line": line})
+
+    def _publish_state(self, script: str, state: str, **extra):
+        self._publish({"type": "state", "script": script, "state": state, **extra})
+
+    def _publish(self, event: dict):
+        # 呼叫端需持有 self._lock
+        for q in self._subscribers:
+            q.put(event)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/events":
+                    self._stream_events()
+                    return
+                m = _SCRIPT_RE.match(self.path)
+                if not m:
+                    self.send_error(404)
+                    return
+                body = json.dumps(server.run_script(m.group(1))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream_events(self):
+                # 先訂閱再取 snapshot，中間發生的事件不會漏掉
+                q = server.subscribe()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    self._send_event(server.snapshot())
+                    while True:
+                        try:
+                            event = q.get(timeout=KEEPALIVE_INTERVAL)
+                        except queue.Empty:
+                            self.wfile.write(b": keepalive\n\n")
+                            self.wfile.flush()
+                            continue
+                        if event is None:
+                            return
+                        self._send_event(event)
+                except OSError:
+                    pass  # client 斷線
+                finally:
+                    server.unsubscribe(q)
+
+            def _send_event(self, event):
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass  # soak test 時不洗版
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    server = StandInServer("0.0.0.0", port)
+    print(f"[INFO] Stand-in server on http://0.0.0.0:{server.port}, Ctrl+C to stop")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
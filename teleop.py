@@ -0,0 +1,315 @@
+"""
+鍵盤 / 搖桿混合 teleop：
+
+  - 同時按住的按鍵向量相加，再加上搖桿類比軸（前進 / 轉向）的分量
+  - 超過 max_speed 時整組等比例縮小，保留 w+a 這類組合的轉彎比例
+  - 每個 control tick 依 accel / decel 限制逐步逼近目標，不再瞬間跳到新向量
+  - 全零向量的按鍵（q / z）視為煞車，立刻歸零
+
+按鍵事件只改 bytearray 裡的旗標，混合、限速與 publish 都在背景 tick thread，
+tick 內只對預先配置好的 array 做 in-place 運算。
+"""
+
+import array
+import os
+import select
+import struct
+import threading
+import time
+
+# Linux joystick API：struct js_event { u32 time; s16 value; u8 type; u8 number; }
+_JS_EVENT = struct.Struct("<IhBB")
+_JS_EVENT_AXIS = 0x02
+_AXIS_MAX = 32767.0
+POLL_INTERVAL = 0.2
+
+
+class TeleopMixer:
+    def __init__(
+        self,
+        key_map: dict,
+        publish,
+        tick_hz: float = 50.0,
+        max_speed: float = 30.0,
+        accel: float = 120.0,
+        decel: float = 240.0,
+        forward_key: str = "w",
+        turn_key: str = "d",
+    ):
+        """
+        key_map: 按鍵 -> 各輪速度向量（keyboard.yaml 的 key_mappings）
+        publish: publish(speeds)，在 tick thread 呼叫，speeds 為 array('d')
+        accel / decel: 每秒速度變化上限，離開 0 用 accel，往 0 靠近用 decel
+        forward_key / turn_key: 搖桿前進、轉向軸滿格時對應的按鍵向量
+        """
+        self.publish = publish
+        self.period = 1.0 / tick_hz
+        self.max_speed = float(max_speed)
+        self.accel = float(accel)
+        self.decel = float(decel)
+        self.ticks = 0
+
+        self.width = max((len(v) for v in key_map.values()), default=4)
+        self._index = {}  # 按鍵 -> row
+        self._brake_keys = set()
+        rows = []
+        for key, vector in key_map.items():
+            key = str(key).lower()
+            if not any(vector):
+                self._brake_keys.add(key)
+                continue
+            self._index[key] = len(rows)
+            rows.append(list(vector) + [0] * (self.width - len(vector)))
+        self._rows = len(rows)
+        self._vectors = array.array("d", [x for row in rows for x in row])
+        self._held = bytearray(self._rows)
+
+        zero = [0.0] * self.width
+        self._forward = array.array("d", self._axis_vector(key_map, forward_key))
+        self._turn = array.array("d", self._axis_vector(key_map, turn_key))
+        self._axes = array.array("d", [0.0, 0.0])  # (forward, turn)，-1 ~ 1
+        self._target = array.array("d", zero)
+        self._current = array.array("d", zero)
+        self._lanes = range(self.width)
+
+        self._brake = False
+        self._idle = True  # 已送出全零，之後不再重複送
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _axis_vector(self, key_map, key):
+        vector = list(key_map.get(key) or [])
+        return [float(x) for x in vector] + [0.0] * (self.width - len(vector))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def handles(self, key: str) -> bool:
+        return key in self._index or key in self._brake_keys
+
+    # ---- 輸入端：GUI / 搖桿 thread 呼叫，只寫旗標 ----
+
+    def press(self, key: str) -> bool:
+        """回傳是否為有對應的按鍵"""
+        row = self._index.get(key)
+        if row is not None:
+            self._held[row] = 1
+            return True
+        if key in self._brake_keys:
+            self._brake = True
+            return True
+        return False
+
+    def release(self, key: str):
+        row = self._index.get(key)
+        if row is not None:
+            self._held[row] = 0
+
+    def release_all(self):
+        for row in range(self._rows):
+            self._held[row] = 0
+        self._axes[0] = self._axes[1] = 0.0
+
+    def set_axes(self, forward: float, turn: float):
+        self._axes[0] = forward
+        self._axes[1] = turn
+
+    def set_axis(self, index: int, value: float):
+        self._axes[index] = value
+
+    # ---- tick thread ----
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._idle = False  # 啟動時先送一次全零
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停掉 tick thread 後補送一次全零：放開按鍵代表停車，
+        沒有命令逾時保護的機器人不能停在最後一個速度
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.release_all()
+        for j in self._lanes:
+            self._target[j] = self._current[j] = 0.0
+        self._idle = True
+        try:
+            self.publish(self._current)
+        except Exception as e:
+            print(f"[WARN] Teleop stop command failed: {e}")
+
+    def _run(self):
+        period = self.period
+        last = time.monotonic()
+        next_tick = last + period
+        failing = False
+        while not self._stop.is_set():
+            delay = next_tick - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            now = time.monotonic()
+            try:
+                # 被卡住太久時不要一次補太多速度
+                self.tick(min(now - last, 2 * period))
+                if failing:
+                    print("[INFO] Teleop publish recovered")
+                    failing = False
+            except Exception as e:
+                # publish 偶爾失敗（例如斷線中）不能讓 tick thread 結束；連續失敗只印一次
+                if not failing:
+                    print(f"[WARN] Teleop tick failed: {e}")
+                    failing = True
+            last = now
+            next_tick += period
+            if next_tick < now:
+                next_tick = now + period
+
+    def tick(self, dt: float):
+        """算出這個 tick 的輪速並 publish，回傳是否有 publish"""
+        self.ticks += 1
+        current, target = self._current, self._target
+
+        if self._brake:
+            self._brake = False
+            self.release_all()
+            for j in self._lanes:
+                current[j] = 0.0
+            self._idle = False
+
+        self._mix()
+
+        up, down = self.accel * dt, self.decel * dt
+        moving = False
+        for j in self._lanes:
+            c, t = current[j], target[j]
+            if c != t:
+                # 同方向且離 0 越來越遠時算加速，其餘（減速、反向）用 decel
+                step = up if t * c >= 0 and abs(t) > abs(c) else down
+                current[j] = min(t, c + step) if t > c else max(t, c - step)
+            if current[j] != 0.0:
+                moving = True
+
+        if moving:
+            self._idle = False
+        elif self._idle:
+            return False
+        else:
+            self._idle = True  # 全零只送一次
+        self.publish(current)
+        return True
+
+    def _mix(self):
+        target, vectors, held = self._target, self._vectors, self._held
+        width = self.width
+        forward, turn = self._axes[0], self._axes[1]
+        peak = 0.0
+        for j in self._lanes:
+            v = forward * self._forward[j] + turn * self._turn[j]
+            i = j
+            for row in range(self._rows):
+                if held[row]:
+                    v += vectors[i]
+                i += width
+            target[j] = v
+            if abs(v) > peak:
+                peak = abs(v)
+        if peak > self.max_speed:
+            scale = self.max_speed / peak
+            for j in self._lanes:
+                target[j] *= scale
+
+    def state(self) -> tuple:
+        """(目前輸出, 目標) 的複本，給 UI 顯示用"""
+        return tuple(self._current), tuple(self._target)
+
+
+class JoystickReader:
+    """
+    讀 Linux /dev/input/jsN（不需額外套件），把前進 / 轉向軸餵給 TeleopMixer。
+    其他平台或裝置不存在時 start() 回傳 False。
+    """
+
+    def __init__(
+        self,
+        mixer: TeleopMixer,
+        device: str = "/dev/input/js0",
+        forward_axis: int = 1,
+        turn_axis: int = 0,
+        invert_forward: bool = True,
+        invert_turn: bool = False,
+        deadzone: float = 0.1,
+    ):
+        self.mixer = mixer
+        self.device = device
+        self.forward_axis = forward_axis
+        self.turn_axis = turn_axis
+        self._forward_sign = -1.0 if invert_forward else 1.0
+        self._turn_sign = -1.0 if invert_turn else 1.0
+        self.deadzone = deadzone
+        self._fd = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return True
+        try:
+            self._fd = os.open(self.device, os.O_RDONLY)
+        except OSError as e:
+            print(f"[INFO] Gamepad {self.device} not available: {e}")
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print(f"[INFO] Gamepad {self.device} connected")
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _axis_value(self, raw: int) -> float:
+        value = raw / _AXIS_MAX
+        if abs(value) < self.deadzone:
+            return 0.0
+        return max(-1.0, min(1.0, value))
+
+    def _run(self):
+        buf = bytearray(_JS_EVENT.size)
+        view = memoryview(buf)
+        fd = self._fd
+        while not self._stop.is_set():
+            try:
+                # 用 select 等資料，stop() 最多等 POLL_INTERVAL 就能結束
+                readable, _, _ = select.select([fd], [], [], POLL_INTERVAL)
+                if not readable:
+                    continue
+                n = os.readv(fd, [view])
+            except OSError:
+                break
+            if n != _JS_EVENT.size:
+                break  # 裝置拔除
+            _, value, kind, number = _JS_EVENT.unpack_from(buf)
+            if not kind & _JS_EVENT_AXIS:
+                continue  # 按鈕事件；開啟時的初始軸值（type 帶 0x80）照樣套用
+            if number == self.forward_axis:
+                self.mixer.set_axis(0, self._forward_sign * self._axis_value(value))
+            elif number == self.turn_axis:
+                self.mixer.set_axis(1, self._turn_sign * self._axis_value(value))
+        if not self._stop.is_set():
+            print(f"[WARN] Gamepad {self.device} disconnected")
+        os.close(fd)
+        self._fd = None
+        self.mixer.set_axes(0.0, 0.0)
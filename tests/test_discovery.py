@@ -0,0 +1,66 @@
+import pytest
+
+from discovery import ProfileStore, expand_targets, format_host, validate_host
+
+
+@pytest.mark.parametrize(
+    "host",
+    ["192.168.0.10", "robot.local", "pros-car", "fe80::1", "[fe80::1]", "localhost."],
+)
+def test_valid_hosts(host):
+    assert validate_host(host)
+
+
+@pytest.mark.parametrize(
+    "host", ["", "192.168.0.300", "1.2.3", "-robot", "robot_1", "a" * 64, "a b"]
+)
+def test_invalid_hosts(host):
+    assert not validate_host(host)
+
+
+def test_format_host_brackets_ipv6():
+    assert format_host("fe80::1") == "[fe80::1]"
+    assert format_host("[fe80::1]") == "[fe80::1]"
+    assert format_host("192.168.0.10") == "192.168.0.10"
+
+
+def test_expand_subnet_skips_network_and_broadcast():
+    assert expand_targets("192.168.0.0/30") == ["192.168.0.1", "192.168.0.2"]
+
+
+def test_expand_mixed_list_keeps_order_and_dedupes():
+    assert expand_targets("robot.local, 10.0.0.5 [fe80::1]  10.0.0.5") == [
+        "robot.local",
+        "10.0.0.5",
+        "fe80::1",
+    ]
+
+
+@pytest.mark.parametrize(
+    "spec, message",
+    [
+        ("10.0.0.0/16", "Subnet too large"),
+        ("10.0.0.0/33", "Invalid subnet"),
+        ("192.168.0.300", "Invalid host"),
+    ],
+)
+def test_expand_rejects_bad_specs(spec, message):
+    with pytest.raises(ValueError, match=message):
+        expand_targets(spec)
+
+
+def test_best_profile_prefers_scanned_latency(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.yaml"))
+    store.record("10.0.0.1", 5000, 20.0, rosbridge_ok=True)
+    store.record("10.0.0.2", 5000, 5.0, rosbridge_ok=False)
+    store.record("10.0.0.3", 5000, rosbridge_ok=True, connect_ms=1.0)
+    store.record("10.0.0.4", 5000, 8.0, rosbridge_ok=True)
+    assert store.best()["host"] == "10.0.0.4"
+    store.save()
+    assert ProfileStore(store.path).best()["host"] == "10.0.0.4"
+
+
+def test_best_falls_back_to_unscanned_profile(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.yaml"))
+    store.record("10.0.0.3", 5000, rosbridge_ok=True, connect_ms=1.0)
+    assert store.best()["host"] == "10.0.0.3"
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from teleop import TeleopMixer
+
+KEY_MAP = {
+    "w": [30, 30, 30, 30],
+    "s": [-30, -30, -30, -30],
+    "a": [-30, 30, -30, 30],
+    "d": [30, -30, 30, -30],
+    "q": [0, 0, 0, 0],
+}
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def mixer(sent):
+    # dt = 0.1 時每個 tick 加速 12、減速 24
+    return TeleopMixer(
+        KEY_MAP, lambda speeds: sent.append(list(speeds)), accel=120, decel=240
+    )
+
+
+def ramp(mixer, ticks, dt=0.1):
+    for _ in range(ticks):
+        mixer.tick(dt)
+
+
+def test_combined_keys_are_scaled_to_max_speed(mixer):
+    mixer.press("w")
+    mixer.press("a")
+    ramp(mixer, 10)
+    # w + a = [0, 60, 0, 60]，整組等比例縮到 30
+    assert mixer.state() == ((0.0, 30.0, 0.0, 30.0), (0.0, 30.0, 0.0, 30.0))
+
+
+def test_accelerates_with_accel_limit(mixer, sent):
+    mixer.press("w")
+    ramp(mixer, 3)
+    assert [s[0] for s in sent] == pytest.approx([12.0, 24.0, 30.0])
+
+
+def test_reversing_uses_decel_until_past_zero(mixer, sent):
+    mixer.press("w")
+    ramp(mixer, 3)
+    mixer.release("w")
+    mixer.press("s")
+    ramp(mixer, 3)
+    # 30 -> 6 -> -18 用 decel，過了 0 之後改用 accel
+    assert [s[0] for s in sent[3:]] == pytest.approx([6.0, -18.0, -30.0])
+
+
+def test_brake_key_stops_and_clears_held_keys(mixer, sent):
+    mixer.press("w")
+    mixer.press("a")
+    ramp(mixer, 5)
+    assert mixer.press("q")
+    assert mixer.tick(0.1)
+    assert sent[-1] == [0.0, 0.0, 0.0, 0.0]
+    current, target = mixer.state()
+    assert current == target == (0.0, 0.0, 0.0, 0.0)
+    # 按鍵已被清掉，之後不再 publish
+    assert not mixer.tick(0.1)
+
+
+def test_single_zero_publish_when_idle(mixer, sent):
+    assert not mixer.tick(0.1)  # 一開始就是靜止，不送
+    mixer.press("w")
+    ramp(mixer, 3)
+    mixer.release("w")
+    ramp(mixer, 10)
+    zeros = [s for s in sent if not any(s)]
+    assert zeros == [[0.0, 0.0, 0.0, 0.0]]
+    assert sent[-1] == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_release_all_clears_axes(mixer):
+    mixer.set_axes(1.0, 0.5)
+    mixer.press("w")
+    mixer.release_all()
+    ramp(mixer, 1)
+    assert mixer.state()[1] == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_stop_publishes_zero(sent):
+    mixer = TeleopMixer(KEY_MAP, lambda speeds: sent.append(list(speeds)))
+    mixer.start()
+    mixer.press("w")
+    time.sleep(0.1)
+    mixer.stop()
+    assert any(any(s) for s in sent)
+    assert sent[-1] == [0.0, 0.0, 0.0, 0.0]
+    assert not mixer.running